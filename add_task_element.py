@@ -3,22 +3,17 @@
 Script to add a Task element to the database
 """
 
-import sqlite3
-import os
 from datetime import datetime
 
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
+from db_common import get_db_connection, close_db_connection
 
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    return conn
-
-def add_task_element():
-    """Add Task element to the database"""
-    conn = get_db_connection()
+def add_task_element(conn=None):
+    """Add Task element to the database
+    
+    Pass an open connection to reuse it; otherwise the shared connection is used.
+    """
+    if conn is None:
+        conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -37,7 +32,6 @@ def add_task_element():
             print(f"  Name: {existing['name']}")
             print(f"  Enterprise: {existing['enterprise']}")
             print(f"  Element Type: {existing['element']}")
-            conn.close()
             return existing['id']
         
         # Insert the new Task element
@@ -59,17 +53,18 @@ def add_task_element():
         print("=" * 60)
         
         cur.close()
-        conn.close()
         return element_id
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         print(f"Error adding Task element: {e}")
         import traceback
         traceback.print_exc()
         return None
 
 if __name__ == '__main__':
-    add_task_element()
+    try:
+        add_task_element()
+    finally:
+        close_db_connection()
 
@@ -26,6 +26,7 @@ a = Analysis(
     hiddenimports=[
         'flask',
         'flask_cors',
+        'waitress',
         'sqlite3',
         'requests',
         'ddgs',
@@ -49,6 +50,15 @@ a = Analysis(
         'scipy',
         'PIL',
         'tkinter',
+        # Dev, notebook and migration-only packages the app never imports
+        'pytest',
+        '_pytest',
+        'IPython',
+        'notebook',
+        'jupyter_client',
+        'psycopg2',
+        'lib2to3',
+        'pydoc_data',
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
@@ -6,27 +6,28 @@ Uses direct SQL to bypass API validation
 
 import sqlite3
 import os
+import sys
+import random
 import time
 
+import db_common
+
+# Resolved once at import instead of on every connection
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'domainmodel.db')
+
 def get_db_connection():
     """Get database connection with retry logic"""
-    db_path = os.path.join(os.path.dirname(__file__), 'domainmodel.db')
-    if not os.path.exists(db_path):
-        print(f"Error: Database file not found at {db_path}")
-        return None
-    
     # Retry logic for locked database
     max_retries = 5
     for attempt in range(max_retries):
         try:
-            conn = sqlite3.connect(db_path, timeout=10.0)
-            conn.row_factory = sqlite3.Row
-            conn.execute('PRAGMA foreign_keys = ON')
-            return conn
+            return db_common.get_db_connection(DB_PATH)
         except sqlite3.OperationalError as e:
             if 'locked' in str(e).lower() and attempt < max_retries - 1:
-                print(f"Database locked, retrying in 1 second... (attempt {attempt + 1}/{max_retries})")
-                time.sleep(1)
+                # Exponential backoff with full jitter (base 1 ms, cap 100 ms)
+                delay = random.uniform(0, min(0.1, 0.001 * (1 << attempt)))
+                print(f"Database locked, retrying in {delay * 1000:.1f} ms... (attempt {attempt + 1}/{max_retries})")
+                time.sleep(delay)
             else:
                 print(f"Error connecting to database: {e}")
                 return None
@@ -67,12 +68,15 @@ def check_and_create_process_flow():
                 AND dmr.relationship_type = 'flow'
             ''')
             relationships = cur.fetchall()
-            print("\nExisting Process -> Process flow relationships:")
-            for rel in relationships:
-                print(f"  - ID: {rel['id']}, Source: {rel['source_name']} (ID: {rel['source_element_id']}), Target: {rel['target_name']} (ID: {rel['target_element_id']})")
+            # Build the listing first and write it once rather than one print per row
+            lines = [
+                f"  - ID: {rel['id']}, Source: {rel['source_name']} (ID: {rel['source_element_id']}), Target: {rel['target_name']} (ID: {rel['target_element_id']})"
+                for rel in relationships
+            ]
+            print("\nExisting Process -> Process flow relationships:\n" + "\n".join(lines))
             
             cur.close()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
             return True
         
         # Find Process elements
@@ -82,7 +86,7 @@ def check_and_create_process_flow():
         if len(process_elements) < 1:
             print("Error: No Process elements found in database")
             cur.close()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
             return False
         
         # Use the first Process element for both source and target (self-referential)
@@ -102,26 +106,27 @@ def check_and_create_process_flow():
         print(f"  Source: ID {source_id}, Name: {source_name}")
         print(f"  Target: ID {target_id}, Name: {target_name}")
         
-        # Check if this specific relationship already exists
+        # Note: Self-referential relationships are allowed for relationship rules
+        # The NOT EXISTS guard covers databases without uq_dmr_triple
         cur.execute('''
-            SELECT id FROM domainmodelrelationship 
-            WHERE source_element_id = ? AND target_element_id = ? AND relationship_type = ?
-        ''', (source_id, target_id, 'flow'))
+            INSERT OR IGNORE INTO domainmodelrelationship 
+            (source_element_id, target_element_id, relationship_type, description, created_at, updated_at)
+            SELECT :source_id, :target_id, 'flow', 'Process flows to Process', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            WHERE NOT EXISTS (
+                SELECT 1 FROM domainmodelrelationship
+                WHERE source_element_id = :source_id
+                  AND target_element_id = :target_id
+                  AND relationship_type = 'flow'
+            )
+        ''', {'source_id': source_id, 'target_id': target_id})
         
-        if cur.fetchone():
+        if cur.rowcount == 0:
+            # Nothing inserted: this specific relationship already exists
             print("This specific Process -> Process flow relationship already exists!")
             cur.close()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
             return True
         
-        # Create Process -> Process flow relationship
-        # Note: Self-referential relationships are allowed for relationship rules
-        cur.execute('''
-            INSERT INTO domainmodelrelationship 
-            (source_element_id, target_element_id, relationship_type, description, created_at, updated_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ''', (source_id, target_id, 'flow', 'Process flows to Process'))
-        
         conn.commit()
         relationship_id = cur.lastrowid
         
@@ -132,7 +137,7 @@ def check_and_create_process_flow():
         print(f"   Type: flow")
         
         cur.close()
-        conn.close()
+        db_common.close_db_connection(DB_PATH)
         return True
         
     except Exception as e:
@@ -141,10 +146,14 @@ def check_and_create_process_flow():
         traceback.print_exc()
         if conn:
             conn.rollback()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
         return False
 
 if __name__ == '__main__':
+    if not os.path.exists(DB_PATH):
+        print(f"Error: Database file not found at {DB_PATH}")
+        sys.exit(1)
+    
     print("Checking and creating Process -> Process flow relationship...")
     print("=" * 60)
     success = check_and_create_process_flow()
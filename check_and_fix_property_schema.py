@@ -1,81 +1,170 @@
 #!/usr/bin/env python3
 """Check and fix domainelementproperties schema to allow NULL element_id"""
 
+import re
 import sqlite3
 
 DB_PATH = 'domainmodel.db'
 
-def check_and_fix_schema():
-    conn = sqlite3.connect(DB_PATH)
+# Matches the NOT NULL inside the element_id column definition of the stored DDL
+ELEMENT_ID_NOT_NULL = re.compile(r'(\belement_id\b[^,]*?)\s+NOT\s+NULL', re.IGNORECASE)
+
+def get_properties_table_sql(cur):
+    """Return the stored CREATE TABLE text for domainelementproperties (one sqlite_master lookup)"""
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'domainelementproperties'")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def drop_element_id_not_null_in_place(cur, table_sql):
+    """Drop NOT NULL from element_id by editing the stored DDL (no row rewrite)
+    
+    Removing a NOT NULL constraint is one of the schema edits SQLite documents as
+    safe to make through writable_schema, because existing rows already satisfy
+    the relaxed definition. Must run inside the caller's transaction; run
+    PRAGMA integrity_check after it commits. Returns False if the edit could not
+    be applied, so the caller can fall back to the table rebuild.
+    """
+    new_sql, replaced = ELEMENT_ID_NOT_NULL.subn(r'\1', table_sql, count=1)
+    if not replaced:
+        return False
+    
+    schema_version = cur.execute('PRAGMA schema_version').fetchone()[0]
+    cur.execute('SAVEPOINT drop_not_null')
+    try:
+        cur.execute('PRAGMA writable_schema = ON')
+        cur.execute(
+            "UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = 'domainelementproperties'",
+            (new_sql,)
+        )
+        # Bumping schema_version makes every connection reparse the schema
+        cur.execute(f'PRAGMA schema_version = {schema_version + 1}')
+    except sqlite3.DatabaseError:
+        cur.execute('ROLLBACK TO drop_not_null')
+        return False
+    finally:
+        cur.execute('PRAGMA writable_schema = OFF')
+        cur.execute('RELEASE drop_not_null')
+    return True
+
+def rebuild_properties_table(cur):
+    """Fallback migration: copy domainelementproperties into a nullable table"""
+    # Create new table
+    cur.execute('''
+        CREATE TABLE domainelementproperties_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            element_id INTEGER,
+            ragtype TEXT,
+            propertyname TEXT,
+            description TEXT,
+            image_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (element_id) REFERENCES domainmodel(id)
+        )
+    ''')
+    
+    # Copy data
+    cur.execute('''
+        INSERT INTO domainelementproperties_new 
+        (id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
+        SELECT id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at
+        FROM domainelementproperties
+    ''')
+    
+    # Drop old and rename
+    cur.execute('DROP TABLE domainelementproperties')
+    cur.execute('ALTER TABLE domainelementproperties_new RENAME TO domainelementproperties')
+    
+    # Recreate index
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
+
+def check_and_fix_schema(conn=None):
+    """Check and fix the schema; pass an open connection to reuse it
+    
+    All DDL runs in one BEGIN IMMEDIATE transaction with deferred foreign keys,
+    so the fix-up commits (and fsyncs) once and a crash leaves the schema untouched.
+    A connection opened here is closed on return; a passed-in one is left open.
+    """
+    owns_conn = conn is None
+    if owns_conn:
+        conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # manual transaction control
+    migrated = False
+    edited_in_place = False
     
     try:
-        # Check current schema
-        cur.execute('PRAGMA table_info(domainelementproperties)')
-        columns = cur.fetchall()
+        cur.execute('BEGIN IMMEDIATE')
+        cur.execute('PRAGMA defer_foreign_keys = ON')
         
-        print("Current schema:")
-        for col in columns:
-            notnull = "NOT NULL" if col[3] else "NULLABLE"
-            print(f"  {col[1]}: {notnull}")
+        # Read the stored DDL once instead of materialising PRAGMA table_info rows
+        table_sql = get_properties_table_sql(cur)
         
-        # Find element_id column
-        element_id_col = next((col for col in columns if col[1] == 'element_id'), None)
-        
-        if element_id_col and element_id_col[3] == 1:  # notnull = 1 means NOT NULL
+        if table_sql and ELEMENT_ID_NOT_NULL.search(table_sql):
             print("\n[MIGRATION NEEDED] element_id is NOT NULL, migrating...")
+            migrated = True
             
-            # Create new table
-            cur.execute('''
-                CREATE TABLE domainelementproperties_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    element_id INTEGER,
-                    ragtype TEXT,
-                    propertyname TEXT,
-                    description TEXT,
-                    image_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (element_id) REFERENCES domainmodel(id)
-                )
-            ''')
-            
-            # Copy data
+            edited_in_place = drop_element_id_not_null_in_place(cur, table_sql)
+            if edited_in_place:
+                print("  Dropped NOT NULL in place (no table rewrite)")
+            else:
+                print("  In-place schema edit failed, rebuilding the table...")
+                rebuild_properties_table(cur)
+        elif table_sql:
+            print("✓ Schema is already correct (element_id allows NULL)")
+        else:
+            print("[WARNING] domainelementproperties table not found")
+        
+        # Enforce one relationship per (source, target, type) so scripts can use INSERT OR IGNORE
+        cur.execute('SAVEPOINT uq_dmr_triple')
+        try:
             cur.execute('''
-                INSERT INTO domainelementproperties_new 
-                (id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
-                SELECT id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at
-                FROM domainelementproperties
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_dmr_triple
+                ON domainmodelrelationship(source_element_id, target_element_id, relationship_type)
             ''')
-            
-            # Drop old and rename
-            cur.execute('DROP TABLE domainelementproperties')
-            cur.execute('ALTER TABLE domainelementproperties_new RENAME TO domainelementproperties')
-            
-            # Recreate index
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
-            
-            conn.commit()
-            print("✓ Migration completed successfully!")
-            
-            # Verify
-            cur.execute('PRAGMA table_info(domainelementproperties)')
-            columns = cur.fetchall()
-            print("\nNew schema:")
-            for col in columns:
-                notnull = "NOT NULL" if col[3] else "NULLABLE"
-                print(f"  {col[1]}: {notnull}")
-        else:
-            print("\n✓ Schema is already correct (element_id allows NULL)")
+            print("✓ Unique relationship index present (uq_dmr_triple)")
+        except sqlite3.IntegrityError as e:
+            cur.execute('ROLLBACK TO uq_dmr_triple')
+            print(f"\n[WARNING] Could not create uq_dmr_triple, duplicate relationships exist: {e}")
+        finally:
+            cur.execute('RELEASE uq_dmr_triple')
+        
+        # Indexes for the element-type filters and relationship joins used by the scripts.
+        # The relationship indexes share names with server.py's init_database so neither duplicates them.
+        # The (element, name) index is the one fix_property_schema.py creates; its leftmost column
+        # serves element-only lookups, so an earlier single-column element index is dropped
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_element_name ON domainmodel(element, name)')
+        cur.execute('DROP INDEX IF EXISTS idx_domainmodel_element')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_relationship_source ON domainmodelrelationship(source_element_id)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_relationship_target ON domainmodelrelationship(target_element_id)')
+        cur.execute('ANALYZE')
+        
+        cur.execute('COMMIT')
+        print("✓ Element and relationship indexes present")
+        
+        if edited_in_place:
+            result = cur.execute('PRAGMA integrity_check').fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f'integrity_check failed after schema edit: {result}')
+        if migrated:
+            print("✓ Migration completed successfully! element_id now allows NULL")
             
     except Exception as e:
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
-        conn.rollback()
+        if conn.in_transaction:
+            cur.execute('ROLLBACK')
     finally:
-        conn.close()
+        conn.isolation_level = isolation_level
+        cur.close()
+        if owns_conn:
+            conn.close()
 
 if __name__ == '__main__':
-    check_and_fix_schema()
-
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        check_and_fix_schema(conn)
+    finally:
+        conn.close()
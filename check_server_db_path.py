@@ -1,29 +1,37 @@
 #!/usr/bin/env python3
 import os
 import sys
+from functools import cache
 
-# Simulate server.py logic
-if getattr(sys, 'frozen', False):
-    app_data = os.getenv('APPDATA')
-    if app_data:
-        db_path = os.path.join(app_data, 'EDGY_Repository_Modeller', 'domainmodel.db')
-    else:
-        db_path = 'domainmodel.db'
-else:
-    db_path = os.getenv('DB_PATH', 'domainmodel.db')
+@cache
+def resolve_db_path():
+    """Resolve the DB path the same way server.py does (computed once per process)"""
+    if getattr(sys, 'frozen', False):
+        app_data = os.environ.get('APPDATA')
+        if app_data:
+            return os.path.join(app_data, 'EDGY_Repository_Modeller', 'domainmodel.db')
+        return 'domainmodel.db'
+    return os.environ.get('DB_PATH', 'domainmodel.db')
 
-print(f"Server would use DB path: {db_path}")
-print(f"DB exists: {os.path.exists(db_path)}")
-
-if os.path.exists(db_path):
-    import sqlite3
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute('PRAGMA table_info(domainelementproperties)')
-    columns = cur.fetchall()
-    print("\nSchema in server DB:")
-    for col in columns:
-        notnull = "NOT NULL" if col[3] else "NULLABLE"
-        print(f"  {col[1]}: {notnull}")
-    conn.close()
+def main():
+    db_path = resolve_db_path()
+    db_exists = os.path.exists(db_path)
+    print(f"Server would use DB path: {db_path}")
+    print(f"DB exists: {db_exists}")
+    
+    if db_exists:
+        import sqlite3
+        # Read-only: a check script must never write to the live database
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=2)
+        conn.execute('PRAGMA query_only = 1')
+        cur = conn.cursor()
+        cur.execute('PRAGMA table_info(domainelementproperties)')
+        columns = cur.fetchall()
+        print("\nSchema in server DB:")
+        for col in columns:
+            notnull = "NOT NULL" if col[3] else "NULLABLE"
+            print(f"  {col[1]}: {notnull}")
+        conn.close()
 
+if __name__ == '__main__':
+    main()
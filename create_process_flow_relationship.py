@@ -3,20 +3,18 @@
 Script to create Process -> Process flow relationship in domainmodelrelationship table
 """
 
-import sqlite3
 import os
+import sys
+
+import db_common
+
+# Resolved once at import instead of on every connection
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'domainmodel.db')
 
 def get_db_connection():
     """Get database connection"""
-    db_path = os.path.join(os.path.dirname(__file__), 'domainmodel.db')
-    if not os.path.exists(db_path):
-        print(f"Error: Database file not found at {db_path}")
-        return None
-    
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return db_common.get_db_connection(DB_PATH)
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
@@ -44,7 +42,7 @@ def create_process_flow_relationship():
         if count > 0:
             print("Process -> Process flow relationship already exists!")
             cur.close()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
             return True
         
         # Find Process elements
@@ -54,7 +52,7 @@ def create_process_flow_relationship():
         if len(process_elements) < 1:
             print(f"Error: No Process elements found in database")
             cur.close()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
             return False
         
         # Use the first Process element for both source and target (self-referential)
@@ -73,27 +71,29 @@ def create_process_flow_relationship():
         print(f"  Source: ID {source_id}, Name: {source_name}")
         print(f"  Target: ID {target_id}, Name: {target_name}")
         
-        # Check if this specific relationship already exists
-        cur.execute('''
-            SELECT id FROM domainmodelrelationship 
-            WHERE source_element_id = ? AND target_element_id = ? AND relationship_type = ?
-        ''', (source_id, target_id, 'flow'))
-        
-        if cur.fetchone():
-            print("This specific Process -> Process flow relationship already exists!")
-            cur.close()
-            conn.close()
-            return True
-        
         # Note: Self-referential relationships (source_id == target_id) are allowed
         # This creates a rule that Process can flow to Process
         
         # Create Process -> Process flow relationship
+        # The NOT EXISTS guard covers databases without uq_dmr_triple
         cur.execute('''
-            INSERT INTO domainmodelrelationship 
+            INSERT OR IGNORE INTO domainmodelrelationship 
             (source_element_id, target_element_id, relationship_type, description, created_at, updated_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ''', (source_id, target_id, 'flow', 'Process flows to Process'))
+            SELECT :source_id, :target_id, 'flow', 'Process flows to Process', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            WHERE NOT EXISTS (
+                SELECT 1 FROM domainmodelrelationship
+                WHERE source_element_id = :source_id
+                  AND target_element_id = :target_id
+                  AND relationship_type = 'flow'
+            )
+        ''', {'source_id': source_id, 'target_id': target_id})
+        
+        if cur.rowcount == 0:
+            # Nothing inserted: this specific relationship already exists
+            print("This specific Process -> Process flow relationship already exists!")
+            cur.close()
+            db_common.close_db_connection(DB_PATH)
+            return True
         
         conn.commit()
         relationship_id = cur.lastrowid
@@ -105,7 +105,7 @@ def create_process_flow_relationship():
         print(f"   Type: flow")
         
         cur.close()
-        conn.close()
+        db_common.close_db_connection(DB_PATH)
         return True
         
     except Exception as e:
@@ -114,10 +114,14 @@ def create_process_flow_relationship():
         traceback.print_exc()
         if conn:
             conn.rollback()
-            conn.close()
+            db_common.close_db_connection(DB_PATH)
         return False
 
 if __name__ == '__main__':
+    if not os.path.exists(DB_PATH):
+        print(f"Error: Database file not found at {DB_PATH}")
+        sys.exit(1)
+    
     print("Creating Process -> Process flow relationship...")
     print("=" * 60)
     success = create_process_flow_relationship()
@@ -4,13 +4,21 @@ Script to create Process -> Process flow relationship via API endpoint
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
+API_BASE_URL = 'http://localhost:5000'
+REQUEST_TIMEOUT = 10  # seconds
+
+# Keep-alive session reused across calls instead of a new connection per request
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
 def create_process_flow_via_api():
     """Create Process -> Process flow relationship using the API"""
     try:
         # Call the initialization endpoint
-        response = requests.post('http://localhost:5000/api/canvas/init-process-flow')
+        response = _session.post(f'{API_BASE_URL}/api/canvas/init-process-flow', json={}, timeout=REQUEST_TIMEOUT)
         
         if response.status_code == 200:
             result = response.json()
@@ -22,6 +30,9 @@ def create_process_flow_via_api():
             print(f"Response: {response.text}")
             return False
             
+    except requests.exceptions.Timeout:
+        print(f"Error: Server did not respond within {REQUEST_TIMEOUT} seconds.")
+        return False
     except requests.exceptions.ConnectionError:
         print("Error: Could not connect to server.")
         print("Please make sure the Flask server is running on http://localhost:5000")
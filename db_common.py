@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite connection factory for the database maintenance scripts
+"""
+
+import sqlite3
+import os
+import threading
+
+DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
+
+# Connection PRAGMAs, applied with one executescript call instead of one execute each.
+# WAL + NORMAL sync turn each commit into a WAL append instead of an fsync'd rollback journal.
+_PRAGMAS = '''
+    PRAGMA foreign_keys = ON;
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -20000;
+    PRAGMA busy_timeout = 5000;
+'''
+
+# Used instead of _PRAGMAS for read-only connections: nothing here writes to the file
+# (no journal_mode switch), reads are memory-mapped and writes are refused, so search
+# scripts can share a warm connection without risk
+_READ_PRAGMAS = '''
+    PRAGMA query_only = ON;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA cache_size = -20000;
+    PRAGMA busy_timeout = 5000;
+'''
+
+# One open connection per thread and database path
+_local = threading.local()
+
+def _connections():
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+    return _local.connections
+
+def get_db_connection(db_path=DB_PATH, read_only=False, row_factory=sqlite3.Row):
+    """Return this thread's connection to db_path, opening it on first use
+    
+    The connection is in autocommit mode (isolation_level=None): multi-write
+    blocks open their own BEGIN IMMEDIATE transaction. read_only=True returns a
+    separate connection opened with mode=ro, which never creates or writes the
+    file. row_factory is set on every call, so a
+    caller that only unpacks tuples can pass None. Do not close it directly; call
+    close_db_connection() with the same arguments so the next call reopens it.
+    """
+    connections = _connections()
+    conn = connections.get((db_path, read_only))
+    if conn is None:
+        if read_only:
+            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=10.0, isolation_level=None)
+            conn.executescript(_READ_PRAGMAS)
+        else:
+            conn = sqlite3.connect(db_path, timeout=10.0, isolation_level=None)
+            conn.executescript(_PRAGMAS)
+        connections[(db_path, read_only)] = conn
+    conn.row_factory = row_factory
+    return conn
+
+def close_db_connection(db_path=DB_PATH, read_only=False):
+    """Close this thread's connection to db_path, if one is open"""
+    conn = _connections().pop((db_path, read_only), None)
+    if conn is not None:
+        conn.close()
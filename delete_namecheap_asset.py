@@ -1,223 +1,240 @@
 #!/usr/bin/env python3
 """
 Script to delete Namecheap Asset element from the database
+
+Foreign keys stay enforced during the delete. Unlike earlier versions, which
+switched them off, an element whose type or properties are still placed on a
+canvas is not deleted; the blocking canvas instances are reported instead.
 """
 
 import sqlite3
-import os
-
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
 
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    return conn
+from db_common import get_db_connection, close_db_connection
 
-def find_namecheap_asset():
-    """Find the Namecheap Asset element"""
-    conn = get_db_connection()
+def find_namecheap_asset(conn=None):
+    """Find the Namecheap Asset element; pass an open connection to reuse it"""
+    if conn is None:
+        conn = get_db_connection()
     cur = conn.cursor()
     
-    # Find the Namecheap Asset element
-    cur.execute('''
-        SELECT id, name, enterprise, facet, element, created_at
-        FROM domainmodel
-        WHERE name LIKE '%Namecheap%' AND element = 'Asset'
-    ''')
+    # Find the Namecheap Asset element. The trigram index from fix_property_schema.py
+    # answers the substring match without scanning; fall back to LIKE if it is missing.
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'domainmodel_fts'")
+    if cur.fetchone():
+        cur.execute('''
+            SELECT d.id, d.name, d.enterprise, d.facet, d.element, d.created_at
+            FROM domainmodel_fts f
+            JOIN domainmodel d ON d.id = f.rowid
+            WHERE domainmodel_fts MATCH 'name : "Namecheap"' AND d.element = 'Asset'
+        ''')
+    else:
+        cur.execute('''
+            SELECT id, name, enterprise, facet, element, created_at
+            FROM domainmodel
+            WHERE name LIKE '%Namecheap%' AND element = 'Asset'
+        ''')
     
     records = cur.fetchall()
     
     if not records:
         print("No Namecheap Asset element found!")
-        conn.close()
         return None
     
     print(f"Found {len(records)} Namecheap Asset element(s):")
     for record in records:
         print(f"  ID: {record['id']}, Name: {record['name']}, Enterprise: {record['enterprise']}, Created: {record['created_at']}")
     
-    conn.close()
-    return records[0] if records else None
+    return records[0]
 
-def check_foreign_key_references(element_id):
-    """Check what foreign key references exist for an element"""
-    conn = get_db_connection()
+def check_foreign_key_references(element_id, conn=None):
+    """Count the foreign key references to an element, per referencing table"""
+    if conn is None:
+        conn = get_db_connection()
     cur = conn.cursor()
     
-    references = {
-        'relationships_as_source': [],
-        'relationships_as_target': [],
-        'properties': [],
-        'diagram_elements': []
-    }
-    
-    # Check relationships where this element is source
+    # One statement returning the four reference counts; rows themselves are never needed.
+    # A relationship from the element to itself is counted once, so the counts sum to
+    # the rows the delete removes.
     cur.execute('''
-        SELECT id, source_element_id, target_element_id, relationship_type
-        FROM domainmodelrelationship
-        WHERE source_element_id = ?
-    ''', (element_id,))
-    references['relationships_as_source'] = cur.fetchall()
-    
-    # Check relationships where this element is target
-    cur.execute('''
-        SELECT id, source_element_id, target_element_id, relationship_type
-        FROM domainmodelrelationship
-        WHERE target_element_id = ?
-    ''', (element_id,))
-    references['relationships_as_target'] = cur.fetchall()
-    
-    # Check properties
-    cur.execute('''
-        SELECT id, element_id, propertyname
-        FROM domainelementproperties
-        WHERE element_id = ?
-    ''', (element_id,))
-    references['properties'] = cur.fetchall()
-    
-    # Check diagram elements
-    cur.execute('''
-        SELECT id, diagram_id, element_id
-        FROM plantumldiagram_elements
-        WHERE element_id = ?
-    ''', (element_id,))
-    references['diagram_elements'] = cur.fetchall()
-    
-    conn.close()
+        SELECT
+            (SELECT COUNT(*) FROM domainmodelrelationship
+             WHERE source_element_id = :id OR target_element_id = :id),
+            (SELECT COUNT(*) FROM domainelementproperties WHERE element_id = :id),
+            (SELECT COUNT(*) FROM plantumldiagram_elements WHERE element_id = :id),
+            (SELECT COUNT(*) FROM element_versions WHERE element_id = :id)
+    ''', {'id': element_id})
+    relationship_count, property_count, diagram_count, version_count = cur.fetchone()
+    
+    return {
+        'relationships': relationship_count,
+        'properties': property_count,
+        'diagram_elements': diagram_count,
+        'element_versions': version_count
+    }
+
+# Columns referencing domainmodel(id), per child table. fix_property_schema.py turns these
+# foreign keys into ON DELETE CASCADE; until it has run, the rows are deleted explicitly.
+ELEMENT_REFERENCES = (
+    ('domainmodelrelationship', ('source_element_id', 'target_element_id')),
+    ('domainelementproperties', ('element_id',)),
+    ('plantumldiagram_elements', ('element_id',)),
+    ('element_versions', ('element_id',)),
+)
+
+def non_cascading_references(conn):
+    """Return the (table, column) element references that do not cascade on delete"""
+    cur = conn.cursor()
+    references = []
+    for table, columns in ELEMENT_REFERENCES:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if not cur.fetchone():
+            continue
+        cur.execute(
+            "SELECT \"from\" FROM pragma_foreign_key_list(?) WHERE \"table\" = 'domainmodel' AND on_delete = 'CASCADE'",
+            (table,)
+        )
+        cascading = {row[0] for row in cur.fetchall()}
+        references.extend((table, column) for column in columns if column not in cascading)
     return references
 
-def delete_element_with_references(element_id):
-    """Delete an element and all its foreign key references"""
-    conn = get_db_connection()
+def count_canvas_references(element_id, conn):
+    """Count the canvas instances that block deleting an element
+    
+    Neither canvas_element_instances.element_type_id nor
+    canvas_property_instances.property_id cascades, so instances of the element
+    or of its properties make the delete fail with a foreign key error.
+    """
+    cur = conn.cursor()
+    counts = {}
+    for label, sql in (
+        ('element instances', 'SELECT COUNT(*) FROM canvas_element_instances WHERE element_type_id = ?'),
+        ('property instances', '''
+            SELECT COUNT(*) FROM canvas_property_instances
+            WHERE property_id IN (SELECT id FROM domainelementproperties WHERE element_id = ?)
+        '''),
+    ):
+        try:
+            cur.execute(sql, (element_id,))
+            counts[label] = cur.fetchone()[0]
+        except sqlite3.OperationalError:
+            # Table not present in this database
+            counts[label] = 0
+    return counts
+
+def delete_element_with_references(element_id, conn=None, references_deleted=None):
+    """Delete an element together with its references
+    
+    References whose foreign key has ON DELETE CASCADE (see fix_property_schema.py)
+    go with the element; the rest are deleted explicitly first, in the same
+    transaction. An element still used on a canvas is not deleted (see
+    count_canvas_references). references_deleted is the total from
+    check_foreign_key_references, if the caller already has it; it is only
+    reported, never recounted here.
+    """
+    if conn is None:
+        conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        # Temporarily disable foreign keys
-        conn.execute('PRAGMA foreign_keys = OFF')
-        
-        # Delete all related records
-        relationships_deleted_as_source = 0
-        relationships_deleted_as_target = 0
-        properties_deleted = 0
-        diagram_elements_deleted = 0
-        history_deleted = 0
-        
-        # Delete relationships where element is source
+        explicit_references = non_cascading_references(conn)
+        # Take the write lock up front rather than upgrading a deferred transaction
+        # mid-delete, which can fail with SQLITE_BUSY while the server is writing
+        cur.execute('BEGIN IMMEDIATE')
         try:
-            cur.execute('DELETE FROM domainmodelrelationship WHERE source_element_id = ?', (element_id,))
-            relationships_deleted_as_source = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete relationships as source: {e}")
-        
-        # Delete relationships where element is target
-        try:
-            cur.execute('DELETE FROM domainmodelrelationship WHERE target_element_id = ?', (element_id,))
-            relationships_deleted_as_target = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete relationships as target: {e}")
-        
-        # Delete properties
-        try:
-            cur.execute('DELETE FROM domainelementproperties WHERE element_id = ?', (element_id,))
-            properties_deleted = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete properties: {e}")
-        
-        # Delete diagram elements
-        try:
-            cur.execute('DELETE FROM plantumldiagram_elements WHERE element_id = ?', (element_id,))
-            diagram_elements_deleted = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete diagram elements: {e}")
-        
-        # Delete element versions
-        try:
-            cur.execute('DELETE FROM element_versions WHERE element_id = ?', (element_id,))
-            history_deleted = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete element versions: {e}")
-        
-        # Delete the element itself
-        cur.execute('DELETE FROM domainmodel WHERE id = ?', (element_id,))
-        element_deleted = cur.rowcount
-        
-        # Re-enable foreign keys
-        conn.execute('PRAGMA foreign_keys = ON')
+            for table, column in explicit_references:
+                cur.execute(f'DELETE FROM {table} WHERE {column} = ?', (element_id,))
+            cur.execute('DELETE FROM domainmodel WHERE id = ?', (element_id,))
+            element_deleted = cur.rowcount
+            cur.execute('COMMIT')
+        except Exception:
+            cur.execute('ROLLBACK')
+            raise
         
         if element_deleted > 0:
-            conn.commit()
             print(f"\nSuccessfully deleted Namecheap Asset element ID {element_id}")
-            print(f"Deleted references:")
-            print(f"  Relationships as source: {relationships_deleted_as_source}")
-            print(f"  Relationships as target: {relationships_deleted_as_target}")
-            print(f"  Properties: {properties_deleted}")
-            print(f"  Diagram elements: {diagram_elements_deleted}")
-            print(f"  History records: {history_deleted}")
-            conn.close()
+            if references_deleted is not None:
+                print(f"Deleted references: {references_deleted}")
             return True
         else:
             print(f"\nNo element found with ID {element_id}")
-            conn.close()
             return False
+    except sqlite3.IntegrityError as e:
+        print(f"Error deleting element: {e}")
+        blocking = {label: count for label, count in count_canvas_references(element_id, conn).items() if count}
+        if blocking:
+            print("The element is still used on canvas models; remove these instances first:")
+            for label, count in blocking.items():
+                print(f"  Canvas {label}: {count}")
+        return False
     except Exception as e:
-        conn.rollback()
-        conn.execute('PRAGMA foreign_keys = ON')
-        conn.close()
         print(f"Error deleting element: {e}")
         import traceback
         traceback.print_exc()
         return False
 
 def main():
-    print("=" * 60)
-    print("Delete Namecheap Asset Element")
-    print("=" * 60)
-    
-    # Find the element
-    element = find_namecheap_asset()
-    
-    if not element:
-        return
+    import argparse
     
-    element_id = element['id']
-    element_name = element['name']
+    parser = argparse.ArgumentParser(
+        description='Delete the Namecheap Asset element from the database',
+        epilog='Foreign keys stay enforced: an element still used on a canvas is reported, not deleted.'
+    )
+    parser.add_argument('--quiet', action='store_true', help='Delete without the reference report or confirmation prompt')
     
-    # Check references
-    print(f"\nChecking foreign key references for '{element_name}' (ID: {element_id})...")
-    references = check_foreign_key_references(element_id)
+    args = parser.parse_args()
     
-    total_refs = (len(references['relationships_as_source']) + 
-                  len(references['relationships_as_target']) + 
-                  len(references['properties']) + 
-                  len(references['diagram_elements']))
-    
-    if total_refs > 0:
-        print(f"\nFound {total_refs} foreign key reference(s):")
-        print(f"  Relationships as source: {len(references['relationships_as_source'])}")
-        print(f"  Relationships as target: {len(references['relationships_as_target'])}")
-        print(f"  Properties: {len(references['properties'])}")
-        print(f"  Diagram elements: {len(references['diagram_elements'])}")
-    
-    # Confirm deletion
-    print(f"\nAre you sure you want to delete '{element_name}' (ID: {element_id})?")
-    confirm = input("Type 'yes' to confirm: ")
-    
-    if confirm.lower() != 'yes':
-        print("Deletion cancelled.")
-        return
+    print("=" * 60)
+    print("Delete Namecheap Asset Element")
+    print("=" * 60)
     
-    # Delete the element
-    print(f"\nDeleting '{element_name}' (ID: {element_id})...")
-    if delete_element_with_references(element_id):
-        print("\n" + "=" * 60)
-        print("SUCCESS: Namecheap Asset element has been deleted!")
-        print("=" * 60)
-    else:
-        print("\n" + "=" * 60)
-        print("ERROR: Failed to delete Namecheap Asset element")
-        print("=" * 60)
+    # One connection for the whole run
+    conn = get_db_connection()
+    try:
+        # Find the element
+        element = find_namecheap_asset(conn)
+        
+        if not element:
+            return
+        
+        element_id = element['id']
+        element_name = element['name']
+        
+        # The reference report only informs the confirmation prompt; --quiet skips both
+        total_refs = None
+        if not args.quiet:
+            # Check references
+            print(f"\nChecking foreign key references for '{element_name}' (ID: {element_id})...")
+            references = check_foreign_key_references(element_id, conn)
+            
+            total_refs = sum(references.values())
+            
+            if total_refs > 0:
+                print(f"\nFound {total_refs} foreign key reference(s):")
+                print(f"  Relationships: {references['relationships']}")
+                print(f"  Properties: {references['properties']}")
+                print(f"  Diagram elements: {references['diagram_elements']}")
+                print(f"  Element versions: {references['element_versions']}")
+            
+            # Confirm deletion
+            print(f"\nAre you sure you want to delete '{element_name}' (ID: {element_id})?")
+            confirm = input("Type 'yes' to confirm: ")
+            
+            if confirm.lower() != 'yes':
+                print("Deletion cancelled.")
+                return
+        
+        # Delete the element
+        print(f"\nDeleting '{element_name}' (ID: {element_id})...")
+        if delete_element_with_references(element_id, conn, total_refs):
+            print("\n" + "=" * 60)
+            print("SUCCESS: Namecheap Asset element has been deleted!")
+            print("=" * 60)
+        else:
+            print("\n" + "=" * 60)
+            print("ERROR: Failed to delete Namecheap Asset element")
+            print("=" * 60)
+    finally:
+        close_db_connection()
 
 if __name__ == '__main__':
     main()
@@ -3,21 +3,11 @@
 Script to fix duplicate Brand elements by handling foreign key constraints
 """
 
-import sqlite3
-import os
 
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
+from db_common import get_db_connection, close_db_connection
 
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    return conn
-
-def find_duplicate_brands():
+def find_duplicate_brands(conn):
     """Find duplicate Brand elements"""
-    conn = get_db_connection()
     cur = conn.cursor()
     
     # Find all Brand elements
@@ -35,7 +25,6 @@ def find_duplicate_brands():
     
     if len(brands) < 2:
         print("No duplicates found!")
-        conn.close()
         return None, None
     
     # Return the two Brand elements (keep the older one, delete the newer one)
@@ -45,217 +34,189 @@ def find_duplicate_brands():
     print(f"\nKeeping Brand ID {brand1['id']} (older)")
     print(f"Deleting Brand ID {brand2['id']} (newer)")
     
-    conn.close()
     return brand1, brand2
 
-def check_foreign_key_references(element_id):
-    """Check what foreign key references exist for an element"""
-    conn = get_db_connection()
+def check_foreign_key_references(conn, element_id):
+    """Count the foreign key references to an element, per referencing table"""
     cur = conn.cursor()
     
-    references = {
-        'relationships_as_source': [],
-        'relationships_as_target': [],
-        'properties': [],
-        'diagram_elements': []
+    # One statement returning the four reference counts; rows themselves are never needed
+    cur.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM domainmodelrelationship WHERE source_element_id = :id),
+            (SELECT COUNT(*) FROM domainmodelrelationship WHERE target_element_id = :id),
+            (SELECT COUNT(*) FROM domainelementproperties WHERE element_id = :id),
+            (SELECT COUNT(*) FROM plantumldiagram_elements WHERE element_id = :id)
+    ''', {'id': element_id})
+    source_count, target_count, property_count, diagram_count = cur.fetchone()
+    
+    return {
+        'relationships_as_source': source_count,
+        'relationships_as_target': target_count,
+        'properties': property_count,
+        'diagram_elements': diagram_count
     }
+
+def reassign_references(conn, from_id, to_id):
+    """Reassign all foreign key references from one element to another
+    
+    Runs inside the caller's transaction; errors propagate so the caller rolls back.
+    """
+    cur = conn.cursor()
     
-    # Check relationships where this element is source
+    # Relationships are UNIQUE(source, target, type) too: drop the ones the element we
+    # keep already has, then move the rest. Source side first, then target side.
     cur.execute('''
-        SELECT id, source_element_id, target_element_id, relationship_type
-        FROM domainmodelrelationship
+        DELETE FROM domainmodelrelationship
         WHERE source_element_id = ?
-    ''', (element_id,))
-    references['relationships_as_source'] = cur.fetchall()
+        AND EXISTS (
+            SELECT 1 FROM domainmodelrelationship kept
+            WHERE kept.source_element_id = ?
+            AND kept.target_element_id = domainmodelrelationship.target_element_id
+            AND kept.relationship_type IS domainmodelrelationship.relationship_type
+        )
+    ''', (from_id, to_id))
+    relationship_deleted = cur.rowcount
+    
+    # Reassign relationships where element is source
+    cur.execute('''
+        UPDATE domainmodelrelationship
+        SET source_element_id = ?
+        WHERE source_element_id = ?
+    ''', (to_id, from_id))
+    source_count = cur.rowcount
     
-    # Check relationships where this element is target
     cur.execute('''
-        SELECT id, source_element_id, target_element_id, relationship_type
-        FROM domainmodelrelationship
+        DELETE FROM domainmodelrelationship
+        WHERE target_element_id = ?
+        AND EXISTS (
+            SELECT 1 FROM domainmodelrelationship kept
+            WHERE kept.target_element_id = ?
+            AND kept.source_element_id = domainmodelrelationship.source_element_id
+            AND kept.relationship_type IS domainmodelrelationship.relationship_type
+        )
+    ''', (from_id, to_id))
+    relationship_deleted += cur.rowcount
+    
+    # Reassign relationships where element is target
+    cur.execute('''
+        UPDATE domainmodelrelationship
+        SET target_element_id = ?
         WHERE target_element_id = ?
-    ''', (element_id,))
-    references['relationships_as_target'] = cur.fetchall()
+    ''', (to_id, from_id))
+    target_count = cur.rowcount
     
-    # Check properties
+    # Reassign properties
     cur.execute('''
-        SELECT id, element_id, propertyname
-        FROM domainelementproperties
+        UPDATE domainelementproperties
+        SET element_id = ?
         WHERE element_id = ?
-    ''', (element_id,))
-    references['properties'] = cur.fetchall()
+    ''', (to_id, from_id))
+    prop_count = cur.rowcount
     
-    # Check diagram elements
+    # Diagram elements are UNIQUE(diagram_id, element_id): first drop the references
+    # whose diagram already contains the element we keep, then move the rest
     cur.execute('''
-        SELECT id, diagram_id, element_id
-        FROM plantumldiagram_elements
+        DELETE FROM plantumldiagram_elements
         WHERE element_id = ?
-    ''', (element_id,))
-    references['diagram_elements'] = cur.fetchall()
+        AND diagram_id IN (
+            SELECT diagram_id FROM plantumldiagram_elements WHERE element_id = ?
+        )
+    ''', (from_id, to_id))
+    diagram_deleted = cur.rowcount
     
-    conn.close()
-    return references
+    cur.execute('''
+        UPDATE plantumldiagram_elements
+        SET element_id = ?
+        WHERE element_id = ?
+    ''', (to_id, from_id))
+    diagram_count = cur.rowcount
+    
+    print(f"\nReassigned references:")
+    print(f"  Relationships as source: {source_count}")
+    print(f"  Relationships as target: {target_count}")
+    print(f"  Duplicate relationships deleted: {relationship_deleted}")
+    print(f"  Properties: {prop_count}")
+    print(f"  Diagram elements reassigned: {diagram_count}")
+    print(f"  Duplicate diagram elements deleted: {diagram_deleted}")
 
-def reassign_references(from_id, to_id):
-    """Reassign all foreign key references from one element to another"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+def delete_element(conn, element_id):
+    """Delete an element after reassigning references
     
-    try:
-        # Temporarily disable foreign keys for reassignment
-        conn.execute('PRAGMA foreign_keys = OFF')
-        
-        # Reassign relationships where element is source
-        cur.execute('''
-            UPDATE domainmodelrelationship
-            SET source_element_id = ?
-            WHERE source_element_id = ?
-        ''', (to_id, from_id))
-        source_count = cur.rowcount
-        
-        # Reassign relationships where element is target
-        cur.execute('''
-            UPDATE domainmodelrelationship
-            SET target_element_id = ?
-            WHERE target_element_id = ?
-        ''', (to_id, from_id))
-        target_count = cur.rowcount
-        
-        # Reassign properties
-        cur.execute('''
-            UPDATE domainelementproperties
-            SET element_id = ?
-            WHERE element_id = ?
-        ''', (to_id, from_id))
-        prop_count = cur.rowcount
-        
-        # For diagram elements, check if reassignment would cause UNIQUE constraint violation
-        # If so, delete the duplicate reference instead
-        cur.execute('''
-            SELECT diagram_id FROM plantumldiagram_elements
-            WHERE element_id = ?
-        ''', (from_id,))
-        diagram_refs_to_move = cur.fetchall()
-        
-        diagram_count = 0
-        diagram_deleted = 0
-        
-        for ref in diagram_refs_to_move:
-            diagram_id = ref[0]  # Access by index since it's a Row object
-            # Check if the target element already has a reference to this diagram
-            cur.execute('''
-                SELECT id FROM plantumldiagram_elements
-                WHERE diagram_id = ? AND element_id = ?
-            ''', (diagram_id, to_id))
-            existing = cur.fetchone()
-            
-            if existing:
-                # Duplicate reference exists, delete the one we're moving
-                cur.execute('''
-                    DELETE FROM plantumldiagram_elements
-                    WHERE diagram_id = ? AND element_id = ?
-                ''', (diagram_id, from_id))
-                diagram_deleted += 1
-            else:
-                # No duplicate, reassign it
-                cur.execute('''
-                    UPDATE plantumldiagram_elements
-                    SET element_id = ?
-                    WHERE diagram_id = ? AND element_id = ?
-                ''', (to_id, diagram_id, from_id))
-                diagram_count += 1
-        
-        conn.commit()
-        conn.execute('PRAGMA foreign_keys = ON')
-        
-        print(f"\nReassigned references:")
-        print(f"  Relationships as source: {source_count}")
-        print(f"  Relationships as target: {target_count}")
-        print(f"  Properties: {prop_count}")
-        print(f"  Diagram elements reassigned: {diagram_count}")
-        print(f"  Duplicate diagram elements deleted: {diagram_deleted}")
-        
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        conn.execute('PRAGMA foreign_keys = ON')
-        conn.close()
-        print(f"Error reassigning references: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def delete_element(element_id):
-    """Delete an element after reassigning references"""
-    conn = get_db_connection()
+    Runs inside the caller's transaction; returns True if a row was deleted.
+    """
     cur = conn.cursor()
     
-    try:
-        conn.execute('PRAGMA foreign_keys = ON')
-        
-        cur.execute('DELETE FROM domainmodel WHERE id = ?', (element_id,))
-        
-        if cur.rowcount > 0:
-            conn.commit()
-            print(f"\nSuccessfully deleted Brand element ID {element_id}")
-            conn.close()
-            return True
-        else:
-            print(f"\nNo element found with ID {element_id}")
-            conn.close()
-            return False
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        print(f"Error deleting element: {e}")
-        return False
+    cur.execute('DELETE FROM domainmodel WHERE id = ?', (element_id,))
+    
+    if cur.rowcount > 0:
+        print(f"\nSuccessfully deleted Brand element ID {element_id}")
+        return True
+    print(f"\nNo element found with ID {element_id}")
+    return False
 
 def main():
     print("=" * 60)
     print("Duplicate Brand Element Cleanup Script")
     print("=" * 60)
     
-    # Find duplicates
-    brand1, brand2 = find_duplicate_brands()
-    
-    if not brand1 or not brand2:
-        return
-    
-    # Check references for the element to be deleted
-    print(f"\nChecking foreign key references for Brand ID {brand2['id']}...")
-    references = check_foreign_key_references(brand2['id'])
-    
-    total_refs = (len(references['relationships_as_source']) + 
-                  len(references['relationships_as_target']) + 
-                  len(references['properties']) + 
-                  len(references['diagram_elements']))
-    
-    if total_refs > 0:
-        print(f"\nFound {total_refs} foreign key reference(s):")
-        print(f"  Relationships as source: {len(references['relationships_as_source'])}")
-        print(f"  Relationships as target: {len(references['relationships_as_target'])}")
-        print(f"  Properties: {len(references['properties'])}")
-        print(f"  Diagram elements: {len(references['diagram_elements'])}")
+    # One connection for the whole run
+    conn = get_db_connection()
+    try:
+        # Find duplicates
+        brand1, brand2 = find_duplicate_brands(conn)
         
-        # Reassign references to the element we're keeping
-        print(f"\nReassigning references from Brand ID {brand2['id']} to Brand ID {brand1['id']}...")
-        if not reassign_references(brand2['id'], brand1['id']):
-            print("Failed to reassign references. Aborting.")
+        if not brand1 or not brand2:
             return
-    else:
-        print("\nNo foreign key references found. Safe to delete.")
-    
-    # Delete the duplicate
-    print(f"\nDeleting duplicate Brand element ID {brand2['id']}...")
-    if delete_element(brand2['id']):
-        print("\n" + "=" * 60)
-        print("SUCCESS: Duplicate Brand element has been deleted!")
-        print("=" * 60)
-    else:
-        print("\n" + "=" * 60)
-        print("ERROR: Failed to delete duplicate Brand element")
-        print("=" * 60)
+        
+        # Check references for the element to be deleted
+        print(f"\nChecking foreign key references for Brand ID {brand2['id']}...")
+        references = check_foreign_key_references(conn, brand2['id'])
+        
+        total_refs = sum(references.values())
+        
+        if total_refs > 0:
+            print(f"\nFound {total_refs} foreign key reference(s):")
+            print(f"  Relationships as source: {references['relationships_as_source']}")
+            print(f"  Relationships as target: {references['relationships_as_target']}")
+            print(f"  Properties: {references['properties']}")
+            print(f"  Diagram elements: {references['diagram_elements']}")
+        else:
+            print("\nNo foreign key references found. Safe to delete.")
+        
+        # Reassign and delete in a single transaction: either both happen or neither does.
+        # BEGIN IMMEDIATE takes the write lock up front instead of upgrading mid-transaction.
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if total_refs > 0:
+                    # Reassign references to the element we're keeping
+                    print(f"\nReassigning references from Brand ID {brand2['id']} to Brand ID {brand1['id']}...")
+                    reassign_references(conn, brand2['id'], brand1['id'])
+                
+                # Delete the duplicate
+                print(f"\nDeleting duplicate Brand element ID {brand2['id']}...")
+                deleted = delete_element(conn, brand2['id'])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            print(f"Error fixing duplicate Brand: {e}")
+            import traceback
+            traceback.print_exc()
+            deleted = False
+        
+        if deleted:
+            print("\n" + "=" * 60)
+            print("SUCCESS: Duplicate Brand element has been deleted!")
+            print("=" * 60)
+        else:
+            print("\n" + "=" * 60)
+            print("ERROR: Failed to delete duplicate Brand element")
+            print("=" * 60)
+    finally:
+        close_db_connection()
 
 if __name__ == '__main__':
     main()
-
@@ -1,10 +1,133 @@
 #!/usr/bin/env python3
 """Fix domainelementproperties schema to allow NULL element_id"""
 
+import re
 import sqlite3
 
+from check_and_fix_property_schema import (
+    ELEMENT_ID_NOT_NULL,
+    drop_element_id_not_null_in_place,
+    get_properties_table_sql,
+    rebuild_properties_table,
+)
+
 DB_PATH = 'domainmodel.db'
 
+# Child tables whose rows belong to a domainmodel element and should be removed with it
+CASCADE_CHILD_TABLES = (
+    'domainmodelrelationship',
+    'domainelementproperties',
+    'plantumldiagram_elements',
+    'element_versions',
+)
+
+# REFERENCES domainmodel(id) without an ON DELETE action yet
+DOMAINMODEL_FK = re.compile(r'(REFERENCES\s+"?domainmodel"?\s*\(\s*id\s*\))(?!\s+ON\s+DELETE)', re.IGNORECASE)
+
+def add_element_cascade_foreign_keys(conn):
+    """Rebuild child tables so their domainmodel foreign keys use ON DELETE CASCADE
+    
+    Follows SQLite's documented table-rebuild procedure (create *_new from the
+    current DDL, copy, drop, rename, recreate indexes) with foreign keys off,
+    all in one explicit transaction. Tables that already cascade are left untouched.
+    Returns the names of the tables that were rebuilt.
+    """
+    cur = conn.cursor()
+    conn.commit()
+    cur.execute('PRAGMA foreign_keys = OFF')
+    rebuilt = []
+    try:
+        cur.execute('BEGIN')
+        for table in CASCADE_CHILD_TABLES:
+            cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            row = cur.fetchone()
+            if not row:
+                continue
+            new_sql, replaced = DOMAINMODEL_FK.subn(r'\1 ON DELETE CASCADE', row[0])
+            if not replaced:
+                continue
+            
+            cur.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))
+            index_sql = [r[0] for r in cur.fetchall()]
+            
+            new_sql = re.sub(rf'^\s*CREATE\s+TABLE\s+"?{table}"?', f'CREATE TABLE {table}_new', new_sql, count=1, flags=re.IGNORECASE)
+            cur.execute(f'DROP TABLE IF EXISTS {table}_new')
+            cur.execute(new_sql)
+            cur.execute(f'INSERT INTO {table}_new SELECT * FROM {table}')
+            cur.execute(f'DROP TABLE {table}')
+            cur.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+            for sql in index_sql:
+                cur.execute(sql)
+            rebuilt.append(table)
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute('PRAGMA foreign_keys = ON')
+    
+    # Orphans predate the rebuild (they were copied as-is); report them rather than fail
+    for table in rebuilt:
+        orphans = cur.execute(f'PRAGMA foreign_key_check({table})').fetchall()
+        if orphans:
+            print(f"WARNING: {table} has {len(orphans)} row(s) referencing missing parents")
+    return rebuilt
+
+# Trigram FTS5 index over domainmodel name, description and enterprise, kept in sync
+# by triggers. The trigram tokenizer matches arbitrary substrings case-insensitively,
+# so it can stand in for LOWER(col) LIKE '%term%'.
+ELEMENT_FTS_COLUMNS = ('name', 'description', 'enterprise')
+ELEMENT_FTS_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS domainmodel_fts
+        USING fts5(name, description, enterprise, content='domainmodel', content_rowid='id', tokenize='trigram');
+    CREATE TRIGGER IF NOT EXISTS domainmodel_fts_ai AFTER INSERT ON domainmodel BEGIN
+        INSERT INTO domainmodel_fts(rowid, name, description, enterprise)
+        VALUES (new.id, new.name, new.description, new.enterprise);
+    END;
+    CREATE TRIGGER IF NOT EXISTS domainmodel_fts_ad AFTER DELETE ON domainmodel BEGIN
+        INSERT INTO domainmodel_fts(domainmodel_fts, rowid, name, description, enterprise)
+        VALUES ('delete', old.id, old.name, old.description, old.enterprise);
+    END;
+    CREATE TRIGGER IF NOT EXISTS domainmodel_fts_au AFTER UPDATE OF name, description, enterprise ON domainmodel BEGIN
+        INSERT INTO domainmodel_fts(domainmodel_fts, rowid, name, description, enterprise)
+        VALUES ('delete', old.id, old.name, old.description, old.enterprise);
+        INSERT INTO domainmodel_fts(rowid, name, description, enterprise)
+        VALUES (new.id, new.name, new.description, new.enterprise);
+    END;
+'''
+
+# Drops an older name-only domainmodel_fts so it can be recreated with all columns
+DROP_ELEMENT_FTS_SQL = '''
+    DROP TRIGGER IF EXISTS domainmodel_fts_ai;
+    DROP TRIGGER IF EXISTS domainmodel_fts_ad;
+    DROP TRIGGER IF EXISTS domainmodel_fts_au;
+    DROP TABLE IF EXISTS domainmodel_fts;
+'''
+
+def add_element_fts(conn):
+    """Create the domainmodel_fts text index and its sync triggers
+    
+    Skipped (returns False) when the SQLite build lacks FTS5 or the trigram
+    tokenizer (3.34+), so domainmodel writes never depend on a missing module.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM pragma_table_info('domainmodel_fts')")
+    existing = tuple(row[0] for row in cur.fetchall())
+    if existing == ELEMENT_FTS_COLUMNS:
+        return True
+    try:
+        cur.execute('CREATE VIRTUAL TABLE temp.fts_probe USING fts5(name, tokenize=\'trigram\')')
+        cur.execute('DROP TABLE temp.fts_probe')
+    except sqlite3.OperationalError as e:
+        print(f"WARNING: FTS5 trigram index not created ({e})")
+        return False
+    
+    # executescript commits first; the DDL and the initial fill then run as one transaction
+    cur.executescript('BEGIN;' + DROP_ELEMENT_FTS_SQL + ELEMENT_FTS_SQL +
+                      "INSERT INTO domainmodel_fts(domainmodel_fts) VALUES ('rebuild'); COMMIT;")
+    return True
+
 def fix_schema():
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
@@ -15,48 +138,55 @@ def fix_schema():
         conn.commit()
         
         # Check current schema
-        cur.execute('PRAGMA table_info(domainelementproperties)')
-        columns = cur.fetchall()
-        
-        element_id_col = next((col for col in columns if col[1] == 'element_id'), None)
+        table_sql = get_properties_table_sql(cur)
         
-        if element_id_col and element_id_col[3] == 1:  # notnull = 1 means NOT NULL
+        if table_sql and ELEMENT_ID_NOT_NULL.search(table_sql):
             print("Migrating domainelementproperties table to allow NULL element_id...")
             
-            # Create new table
-            cur.execute('''
-                CREATE TABLE domainelementproperties_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    element_id INTEGER,
-                    ragtype TEXT,
-                    propertyname TEXT,
-                    description TEXT,
-                    image_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (element_id) REFERENCES domainmodel(id)
-                )
-            ''')
-            
-            # Copy data
-            cur.execute('''
-                INSERT INTO domainelementproperties_new 
-                (id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
-                SELECT id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at
-                FROM domainelementproperties
-            ''')
-            
-            # Drop old and rename
-            cur.execute('DROP TABLE domainelementproperties')
-            cur.execute('ALTER TABLE domainelementproperties_new RENAME TO domainelementproperties')
-            
-            # Recreate index
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
-            
+            cur.execute('BEGIN')
+            edited_in_place = drop_element_id_not_null_in_place(cur, table_sql)
+            if edited_in_place:
+                print("Dropped NOT NULL in place (no table rewrite)")
+            else:
+                print("In-place schema edit failed, rebuilding the table...")
+                rebuild_properties_table(cur)
             conn.commit()
+            
+            if edited_in_place:
+                result = cur.execute('PRAGMA integrity_check').fetchone()[0]
+                if result != 'ok':
+                    print(f"WARNING: integrity_check after schema edit reported: {result}")
             print("SUCCESS: Migration completed successfully!")
         else:
             print("SUCCESS: Schema already allows NULL for element_id")
+        
+        rebuilt = add_element_cascade_foreign_keys(conn)
+        if rebuilt:
+            print(f"SUCCESS: Added ON DELETE CASCADE to {', '.join(rebuilt)}")
+        else:
+            print("SUCCESS: Element foreign keys already cascade on delete")
+        
+        # Covers WHERE element = ? [AND name LIKE ...] ORDER BY name as one index range scan;
+        # element-only lookups use its leftmost column, so no separate element index is needed
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_element_name ON domainmodel(element, name)')
+        # Expression index for the Demo filter WHERE LOWER(enterprise) = ?
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_enterprise_lower ON domainmodel(LOWER(enterprise))')
+        # Every name search is a substring LIKE ('%abc%') that no index can seek, so an
+        # earlier NOCASE name index only cost writes; substring searches use domainmodel_fts
+        cur.execute('DROP INDEX IF EXISTS idx_domainmodel_name_nocase')
+        # Duplicate key used by remove_duplicate_properties.py, already in window order
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_properties_duplicate_key
+            ON domainelementproperties(propertyname, ragtype, description, image_url, element_id, id)
+        ''')
+        cur.execute('ANALYZE domainmodel')
+        cur.execute('ANALYZE domainelementproperties')
+        conn.commit()
+        print("SUCCESS: Indexes idx_domainmodel_element_name, idx_domainmodel_enterprise_lower "
+              "and idx_properties_duplicate_key are in place")
+        
+        if add_element_fts(conn):
+            print("SUCCESS: Full-text index domainmodel_fts is in place")
             
     except Exception as e:
         print(f"Error: {e}")
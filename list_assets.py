@@ -3,46 +3,42 @@
 Script to list all Asset elements in the database
 """
 
-import sqlite3
-import os
-
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
-
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    return conn
+from db_common import get_db_connection, close_db_connection
 
 def list_assets():
-    """List all Asset elements"""
+    """List all Asset elements, streaming rows from the cursor; returns the count"""
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # Find all Asset elements
-    cur.execute('''
-        SELECT id, name, enterprise, facet, element, created_at
-        FROM domainmodel
-        WHERE element = 'Asset'
-        ORDER BY name
-    ''')
-    
-    records = cur.fetchall()
+    # Count first so the header can be printed without buffering every row
+    cur.execute("SELECT COUNT(*) FROM domainmodel WHERE element = 'Asset'")
+    total = cur.fetchone()[0]
     
-    if not records:
+    if not total:
         print("No Asset elements found!")
     else:
-        print(f"Found {len(records)} Asset element(s):")
+        print(f"Found {total} Asset element(s):")
         print("-" * 80)
-        for record in records:
+        
+        # Find all Asset elements
+        cur.execute('''
+            SELECT id, name, enterprise, facet, element, created_at
+            FROM domainmodel
+            WHERE element = 'Asset'
+            ORDER BY name
+        ''')
+        
+        for record in cur:
             print(f"ID: {record['id']} | Name: {record['name']} | Enterprise: {record['enterprise']} | Facet: {record['facet']}")
     
-    conn.close()
-    return records
+    return total
 
 if __name__ == '__main__':
     print("=" * 80)
     print("Listing all Asset elements")
     print("=" * 80)
-    list_assets()
+    try:
+        list_assets()
+    finally:
+        close_db_connection()
 
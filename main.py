@@ -5,11 +5,10 @@ Handles application initialization and startup for both development and producti
 """
 import sys
 import os
-import webbrowser
+import socket
 import threading
 import time
 import logging
-from pathlib import Path
 
 # Add the application directory to the path
 if getattr(sys, 'frozen', False):
@@ -57,16 +56,33 @@ except ImportError as e:
     input("Press Enter to exit...")
     sys.exit(1)
 
-try:
-    import webview
-    HAS_WEBVIEW = True
-except Exception:
-    HAS_WEBVIEW = False
+def _load_webview():
+    """Import pywebview on first use; returns the module, or None if unavailable"""
+    # Deferred so its GUI bindings are not loaded before the server is up
+    try:
+        import webview
+        return webview
+    except Exception:
+        return None
+
+
+def wait_for_server(host='127.0.0.1', port=5000, timeout=5.0):
+    """Block until the server accepts TCP connections; returns False on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.05).close()
+            return True
+        except OSError:
+            time.sleep(0.02)
+    return False
 
 
 def open_browser():
-    """Open the default web browser after a short delay"""
-    time.sleep(1.5)
+    """Open the default web browser once the server is listening"""
+    import webbrowser
+    if not wait_for_server():
+        logging.warning("Server did not start listening within 5s; opening browser anyway")
     try:
         webbrowser.open('http://127.0.0.1:5000')
     except Exception as e:
@@ -75,8 +91,14 @@ def open_browser():
 
 
 def run_server():
-    """Run Flask server without reloader."""
-    app.run(host='127.0.0.1', port=5000, debug=False, use_reloader=False)
+    """Run the app on waitress's thread pool; fall back to Flask's dev server."""
+    try:
+        from waitress import serve
+    except ImportError:
+        logging.warning("waitress not installed; using Flask development server")
+        app.run(host='127.0.0.1', port=5000, debug=False, use_reloader=False)
+        return
+    serve(app, host='127.0.0.1', port=5000, threads=8)
 
 def main():
     """Main application entry point"""
@@ -102,10 +124,12 @@ def main():
     print("\nThe application will open in your default browser.")
     print("Press Ctrl+C to stop the server.\n")
     
-    if HAS_WEBVIEW:
+    webview = _load_webview()
+    if webview is not None:
         server_thread = threading.Thread(target=run_server, daemon=True)
         server_thread.start()
-        time.sleep(1.0)
+        if not wait_for_server():
+            logging.warning("Server did not start listening within 5s; opening window anyway")
         try:
             webview.create_window(
                 "EDGY Repository Modeller",
@@ -128,7 +152,7 @@ def main():
         
         # Run the Flask app
         try:
-            app.run(host='127.0.0.1', port=5000, debug=False, use_reloader=False)
+            run_server()
         except KeyboardInterrupt:
             print("\n\nShutting down server...")
             sys.exit(0)
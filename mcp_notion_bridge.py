@@ -11,72 +11,258 @@ Usage:
 Or integrate into Flask:
     from mcp_notion_bridge import search_notion_mcp
     results = search_notion_mcp("your query")
+
+Or from asyncio code:
+    results = await search_notion_mcp_async("your query")
 """
 
 import os
 import sys
 import json
+import atexit
 import subprocess
+import threading
+import time
+from html import unescape
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import lru_cache
 from typing import Optional, Dict, List, Any
 
-def search_notion_mcp(query: str, query_type: str = "internal", limit: int = 3) -> Optional[List[Dict[str, Any]]]:
+# orjson parses the raw response bytes directly; stdlib json accepts bytes too
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Persistent MCP client: one stdio server process and initialized ClientSession, owned by
+# a task on a background event loop, shared by every search instead of one per call.
+MCP_CONNECT_TIMEOUT = 30
+MCP_CALL_TIMEOUT = 10
+_mcp_lock = threading.Lock()
+_mcp_loop = None
+_mcp_session = None
+_mcp_owner = None
+_mcp_stop = None
+
+def _get_mcp_session():
+    """Return (loop, session), starting the loop thread and MCP server on first use
+    
+    Raises ImportError when the mcp client library is not installed.
+    """
+    global _mcp_loop, _mcp_session, _mcp_owner, _mcp_stop
+    with _mcp_lock:
+        if _mcp_session is not None and not _mcp_owner.done():
+            return _mcp_loop, _mcp_session
+        
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
+        from mcp.client.stdio import StdioServerParameters
+        import asyncio
+        
+        # MCP server configuration (adjust based on your setup)
+        mcp_server_path = os.getenv('MCP_NOTION_SERVER_PATH', 'npx')
+        mcp_server_args_str = os.getenv('MCP_NOTION_SERVER_ARGS', '-y @modelcontextprotocol/server-notion')
+        mcp_server_args = mcp_server_args_str.split() if isinstance(mcp_server_args_str, str) else mcp_server_args_str
+        server_params = StdioServerParameters(
+            command=mcp_server_path,
+            args=mcp_server_args
+        )
+        
+        if _mcp_loop is None:
+            _mcp_loop = asyncio.new_event_loop()
+            threading.Thread(target=_mcp_loop.run_forever, name='mcp-notion-loop', daemon=True).start()
+        
+        ready = Future()
+        
+        async def _own_session():
+            # The stdio and session contexts must be entered and exited in the same task,
+            # so this task holds them open until _close_mcp_session() sets the stop event
+            stop = asyncio.Event()
+            try:
+                async with stdio_client(server_params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        ready.set_result((session, stop))
+                        await stop.wait()
+            except BaseException as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                raise
+        
+        _mcp_owner = asyncio.run_coroutine_threadsafe(_own_session(), _mcp_loop)
+        _mcp_session, _mcp_stop = ready.result(timeout=MCP_CONNECT_TIMEOUT)
+        return _mcp_loop, _mcp_session
+
+def _close_mcp_session():
+    """Shut down the persistent MCP session; the next search reconnects"""
+    global _mcp_session, _mcp_stop
+    with _mcp_lock:
+        if _mcp_stop is not None and _mcp_loop is not None:
+            _mcp_loop.call_soon_threadsafe(_mcp_stop.set)
+            try:
+                _mcp_owner.result(timeout=5)
+            except Exception:
+                pass
+        elif _mcp_owner is not None and not _mcp_owner.done():
+            # Still connecting (e.g. the connect timed out): abandon the attempt
+            _mcp_owner.cancel()
+        _mcp_session = None
+        _mcp_stop = None
+
+atexit.register(_close_mcp_session)
+
+def _mcp_connection_lost(error: BaseException) -> bool:
+    """True when error means the shared session is unusable rather than one call failing"""
+    if _mcp_session is None or _mcp_owner is None or _mcp_owner.done():
+        return True
+    closed_errors = (EOFError, BrokenPipeError, ConnectionError)
+    try:
+        import anyio
+        closed_errors += (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+    except ImportError:
+        pass
+    return isinstance(error, closed_errors)
+
+# MCP searches currently in flight, keyed by (query, query_type): [future, waiting callers]
+_inflight_searches = {}
+_inflight_lock = threading.Lock()
+
+def _submit_mcp_search(query: str, query_type: str) -> Future:
+    """Start a notion-search call on the shared session, or join an identical one in flight
+    
+    Concurrent callers asking the same question wait on one MCP request; different
+    queries are pipelined on the same session rather than queued behind each other.
+    """
+    import asyncio
+    
+    loop, session = _get_mcp_session()
+    key = (query, query_type)
+    with _inflight_lock:
+        entry = _inflight_searches.get(key)
+        if entry is None:
+            future = asyncio.run_coroutine_threadsafe(
+                session.call_tool(
+                    "notion-search",
+                    {
+                        "query": query,
+                        "query_type": query_type
+                    }
+                ),
+                loop
+            )
+            entry = _inflight_searches[key] = [future, 0]
+            future.add_done_callback(lambda done, key=key: _finish_mcp_search(key, done))
+        entry[1] += 1
+    return entry[0]
+
+def _abandon_mcp_search(query: str, query_type: str, future: Future):
+    """Stop waiting on a shared search; the call is cancelled once its last caller gives up"""
+    with _inflight_lock:
+        entry = _inflight_searches.get((query, query_type))
+        if entry is None or entry[0] is not future:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+    future.cancel()
+
+def _finish_mcp_search(key, future):
+    with _inflight_lock:
+        entry = _inflight_searches.get(key)
+        if entry is not None and entry[0] is future:
+            del _inflight_searches[key]
+
+@lru_cache(maxsize=1)
+def _get_http_session():
+    """Return the shared keep-alive session for the MCP HTTP bridge (created on first use)"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    session.headers['Connection'] = 'keep-alive'
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.2)
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Recent search results, keyed by (normalized query, query_type, limit), least recently used first
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 600  # seconds
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+def _search_cache_key(query: str, query_type: str, limit: int):
+    # Case and whitespace variants of a query share one entry
+    return (' '.join(query.split()).casefold(), query_type, limit)
+
+def search_notion_mcp(query: str, query_type: str = "internal", limit: int = 3,
+                      no_cache: bool = False) -> Optional[List[Dict[str, Any]]]:
     """
-    Search Notion using MCP server.
+    Search Notion using MCP server, answering repeated queries from a short-lived cache.
     
     Args:
         query: Search query string
         query_type: Type of search ("internal" for workspace search)
         limit: Maximum number of results to return
+        no_cache: Skip the cache lookup and always query Notion
         
     Returns:
         List of formatted results with title, content, url, or None if error
     """
+    key = _search_cache_key(query, query_type, limit)
+    now = time.monotonic()
+    
+    if not no_cache:
+        with _search_cache_lock:
+            entry = _search_cache.get(key)
+            if entry and now - entry[0] < SEARCH_CACHE_TTL:
+                _search_cache.move_to_end(key)
+                return [dict(item) for item in entry[1]]
+    
+    results = _search_notion_mcp_uncached(query, query_type, limit)
+    
+    # Failures (None) are not cached so the next call retries
+    if results is not None:
+        with _search_cache_lock:
+            _search_cache[key] = (now, results)
+            _search_cache.move_to_end(key)
+            while len(_search_cache) > SEARCH_CACHE_SIZE:
+                _search_cache.popitem(last=False)
+        results = [dict(item) for item in results]
+    return results
+
+async def search_notion_mcp_async(query: str, query_type: str = "internal", limit: int = 3,
+                                  no_cache: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Coroutine version of search_notion_mcp for asyncio callers.
+    
+    The blocking parts (first connect, HTTP and subprocess fallbacks) run in a worker
+    thread so the caller's event loop is never blocked; concurrent identical searches
+    still share one MCP request.
+    """
+    import asyncio
+    return await asyncio.to_thread(search_notion_mcp, query, query_type, limit, no_cache)
+
+def _search_notion_mcp_uncached(query: str, query_type: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Run a Notion search through the first MCP method that works"""
     try:
         # Method 1: Try using MCP client library if available
         try:
-            from mcp import ClientSession
-            from mcp.client.stdio import stdio_client
-            from mcp.client.stdio import StdioServerParameters
-            import asyncio
-            
-            # MCP server configuration (adjust based on your setup)
-            mcp_server_path = os.getenv('MCP_NOTION_SERVER_PATH', 'npx')
-            mcp_server_args_str = os.getenv('MCP_NOTION_SERVER_ARGS', '-y @modelcontextprotocol/server-notion')
-            mcp_server_args = mcp_server_args_str.split() if isinstance(mcp_server_args_str, str) else mcp_server_args_str
-            
-            async def _search():
-                # Use StdioServerParameters instead of dict
-                server_params = StdioServerParameters(
-                    command=mcp_server_path,
-                    args=mcp_server_args
-                )
-                
-                async with stdio_client(server_params) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        # Initialize session
-                        await session.initialize()
-                        
-                        result = await session.call_tool(
-                            "notion-search",
-                            {
-                                "query": query,
-                                "query_type": query_type
-                            }
-                        )
-                        return result
-                
-            # Run async function - handle event loop properly
+            future = _submit_mcp_search(query, query_type)
             try:
-                # Try to get existing event loop
-                loop = asyncio.get_event_loop()
-                if loop.is_closed():
-                    raise RuntimeError("Event loop is closed")
-            except RuntimeError:
-                # No event loop in this thread, create a new one
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            result = loop.run_until_complete(_search())
+                result = future.result(timeout=MCP_CALL_TIMEOUT)
+            except FutureTimeoutError:
+                # A slow call says nothing about the session; drop only this request,
+                # and only once no other caller is still waiting on it
+                _abandon_mcp_search(query, query_type, future)
+                raise
             
             if result and 'results' in result:
                 return format_mcp_results(result['results'], limit)
@@ -86,19 +272,21 @@ def search_notion_mcp(query: str, query_type: str = "internal", limit: int = 3)
             pass
         except Exception as e:
             print(f"MCP client error: {e}, trying alternative method...")
+            # Drop the session only if it is broken; the next search starts a fresh one
+            if _mcp_connection_lost(e):
+                _close_mcp_session()
         
         # Method 2: Use HTTP bridge if MCP server exposes HTTP endpoint
         mcp_http_url = os.getenv('MCP_NOTION_HTTP_URL')
         if mcp_http_url:
             try:
-                import requests
-                response = requests.post(
+                response = _get_http_session().post(
                     f"{mcp_http_url}/search",
                     json={"query": query, "query_type": query_type},
                     timeout=10
                 )
                 if response.status_code == 200:
-                    result = response.json()
+                    result = _json_loads(response.content)
                     if 'results' in result:
                         return format_mcp_results(result['results'], limit)
             except Exception as e:
@@ -112,11 +300,10 @@ def search_notion_mcp(query: str, query_type: str = "internal", limit: int = 3)
             result = subprocess.run(
                 cmd,
                 capture_output=True,
-                text=True,
                 timeout=10
             )
             if result.returncode == 0:
-                data = json.loads(result.stdout)
+                data = _json_loads(result.stdout)
                 if 'results' in data:
                     return format_mcp_results(data['results'], limit)
         except Exception as e:
@@ -148,16 +335,16 @@ def format_mcp_results(results: List[Dict], limit: int = 3) -> List[Dict[str, An
         url = result.get('url', '')
         page_id = result.get('id', '')
         
-        # Clean HTML entities from highlight
+        # Clean HTML entities from highlight (one pass, covers numeric entities too)
         if highlight:
-            highlight = highlight.replace('&lt;', '<').replace('&gt;', '>')
-            highlight = highlight.replace('&amp;', '&')
+            highlight = unescape(highlight if isinstance(highlight, str) else str(highlight))
         
+        # Values are almost always strings already; only convert the odd one out
         formatted.append({
-            'title': str(title),
-            'content': str(highlight)[:500] if highlight else '',
-            'url': str(url) if url else '',
-            'id': str(page_id) if page_id else ''
+            'title': title if isinstance(title, str) else str(title),
+            'content': highlight[:500] if highlight else '',
+            'url': (url if isinstance(url, str) else str(url)) if url else '',
+            'id': (page_id if isinstance(page_id, str) else str(page_id)) if page_id else ''
         })
     
     return formatted
@@ -7,6 +7,11 @@ This script reads all data from Neon and inserts it into SQLite
 import psycopg2
 import sqlite3
 import os
+import io
+import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from datetime import datetime
 
 # Neon PostgreSQL connection string
@@ -25,11 +30,25 @@ def get_neon_connection():
         print(f"Error connecting to Neon database: {e}")
         return None
 
-def init_sqlite_database(sqlite_conn):
-    """Initialize SQLite database with all required tables"""
+# Bulk-load PRAGMAs: WAL appends instead of a rollback journal, no fsync of the main file
+# per commit, a ~200 MB page cache and 256 MB mmap. Foreign keys are off while loading
+# (parents are migrated before children) and verified once by verify_foreign_keys().
+BULK_LOAD_PRAGMAS = '''
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -200000;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA foreign_keys = OFF;
+'''
+
+def init_sqlite_tables(sqlite_conn):
+    """Initialize SQLite database with all required tables (indexes come after the load)"""
     cur = sqlite_conn.cursor()
     
     try:
+        sqlite_conn.executescript(BULK_LOAD_PRAGMAS)
+        
         # Create domainmodel table
         cur.execute('''
             CREATE TABLE IF NOT EXISTS domainmodel (
@@ -103,7 +122,25 @@ def init_sqlite_database(sqlite_conn):
             )
         ''')
         
-        # Create indexes
+        sqlite_conn.commit()
+        print("[Init] SQLite database tables initialized")
+        return True
+    except Exception as e:
+        print(f"[Init] Error initializing SQLite database: {e}")
+        sqlite_conn.rollback()
+        return False
+    finally:
+        cur.close()
+
+def create_sqlite_indexes(sqlite_conn):
+    """Create the secondary indexes once the tables are loaded, then refresh planner stats
+    
+    Building an index over a populated table is one sort and a sequential write, instead
+    of a scattered B-tree update for every migrated row.
+    """
+    cur = sqlite_conn.cursor()
+    
+    try:
         cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_enterprise ON domainmodel(enterprise)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_facet ON domainmodel(facet)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_relationship_source ON domainmodelrelationship(source_element_id)')
@@ -111,12 +148,14 @@ def init_sqlite_database(sqlite_conn):
         cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_diagram_elements_diagram ON plantumldiagram_elements(diagram_id)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_diagram_elements_element ON plantumldiagram_elements(element_id)')
+        sqlite_conn.commit()
         
+        cur.execute('ANALYZE')
         sqlite_conn.commit()
-        print("[Init] SQLite database tables initialized")
+        print("[Migrate] Indexes created")
         return True
     except Exception as e:
-        print(f"[Init] Error initializing SQLite database: {e}")
+        print(f"[Migrate] Error creating indexes: {e}")
         sqlite_conn.rollback()
         return False
     finally:
@@ -125,7 +164,8 @@ def init_sqlite_database(sqlite_conn):
 def get_sqlite_connection():
     """Connect to SQLite database"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
+        # Generous timeout: concurrent table migrations wait for each other's batch commits
+        conn = sqlite3.connect(SQLITE_DB_PATH, timeout=60.0)
         conn.row_factory = sqlite3.Row
         conn.execute('PRAGMA foreign_keys = ON')
         return conn
@@ -133,48 +173,97 @@ def get_sqlite_connection():
         print(f"Error connecting to SQLite database: {e}")
         return None
 
-def migrate_table(neon_conn, sqlite_conn, table_name, columns, order_by=None):
-    """Migrate a single table from Neon to SQLite"""
+# Rows fetched from Neon and inserted into SQLite per transaction
+BATCH_SIZE = 10000
+
+def insert_rows_individually(sqlite_cur, insert_query, table_name, rows):
+    """Insert rows one at a time, skipping the ones that fail; returns the inserted count"""
+    inserted_count = 0
+    for row in rows:
+        try:
+            sqlite_cur.execute(insert_query, row)
+            inserted_count += 1
+        except sqlite3.IntegrityError as e:
+            print(f"[Migrate] Warning: Skipping duplicate row in {table_name}: {e}")
+            continue
+        except Exception as e:
+            print(f"[Migrate] Error inserting row into {table_name}: {e}")
+            print(f"[Migrate] Row data: {row}")
+            continue
+    return inserted_count
+
+def copy_rows(neon_conn, select_query):
+    """Yield the rows of select_query, streamed from Neon with COPY ... TO STDOUT
+    
+    COPY skips psycopg2's per-row object construction. A writer thread runs copy_expert
+    into a pipe while rows are parsed from the other end as they arrive, so the table is
+    never held in memory. Values arrive as text (SQLite's column affinity converts them);
+    NULL is sent as an unquoted \\N, so a text value of exactly \\N also reads back as NULL.
+    """
+    copy_query = f"COPY ({select_query}) TO STDOUT WITH (FORMAT csv, NULL '\\N')"
+    read_fd, write_fd = os.pipe()
+    errors = []
+    
+    def produce():
+        # The write end is owned before anything can fail, so the reader always gets EOF
+        try:
+            with os.fdopen(write_fd, 'wb') as pipe_out:
+                neon_cur = neon_conn.cursor()
+                try:
+                    neon_cur.copy_expert(copy_query, pipe_out)
+                finally:
+                    neon_cur.close()
+        except Exception as e:
+            errors.append(e)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    with io.TextIOWrapper(os.fdopen(read_fd, 'rb'), encoding='utf-8', newline='') as pipe_in:
+        for row in csv.reader(pipe_in):
+            yield tuple(None if value == '\\N' else value for value in row)
+    producer.join()
+    if errors:
+        raise errors[0]
+
+def migrate_table(neon_conn, sqlite_conn, table_name, select_query, insert_query):
+    """Migrate a single table from Neon to SQLite using prebuilt SELECT and INSERT statements"""
     print(f"\n[Migrate] Migrating table: {table_name}")
     
-    neon_cur = neon_conn.cursor()
     sqlite_cur = sqlite_conn.cursor()
+    executemany = sqlite_cur.executemany
+    rows_iter = None
     
     try:
-        # Build SELECT query
-        select_query = f'SELECT {", ".join(columns)} FROM "{table_name}"'
-        if order_by:
-            select_query += f' ORDER BY {order_by}'
+        rows_iter = copy_rows(neon_conn, select_query)
         
-        # Fetch data from Neon
-        neon_cur.execute(select_query)
-        rows = neon_cur.fetchall()
+        # Insert each batch with one executemany in its own transaction
+        row_count = 0
+        inserted_count = 0
+        while True:
+            rows = list(islice(rows_iter, BATCH_SIZE))
+            if not rows:
+                break
+            row_count += len(rows)
+            
+            # IMMEDIATE takes the write lock up front, so concurrent writers queue on the
+            # busy timeout instead of failing on a read-to-write lock upgrade
+            sqlite_conn.execute('BEGIN IMMEDIATE')
+            try:
+                executemany(insert_query, rows)
+                inserted_count += len(rows)
+            except sqlite3.Error:
+                # One bad row aborts the whole batch; redo it row by row to skip only the bad rows
+                sqlite_conn.rollback()
+                sqlite_conn.execute('BEGIN IMMEDIATE')
+                inserted_count += insert_rows_individually(sqlite_cur, insert_query, table_name, rows)
+            sqlite_conn.commit()
         
-        print(f"[Migrate] Found {len(rows)} rows in Neon {table_name}")
+        print(f"[Migrate] Found {row_count} rows in Neon {table_name}")
         
-        if len(rows) == 0:
+        if row_count == 0:
             print(f"[Migrate] No data to migrate for {table_name}")
             return 0
         
-        # Build INSERT query for SQLite
-        placeholders = ', '.join(['?'] * len(columns))
-        insert_query = f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES ({placeholders})'
-        
-        # Insert data into SQLite
-        inserted_count = 0
-        for row in rows:
-            try:
-                sqlite_cur.execute(insert_query, row)
-                inserted_count += 1
-            except sqlite3.IntegrityError as e:
-                print(f"[Migrate] Warning: Skipping duplicate row in {table_name}: {e}")
-                continue
-            except Exception as e:
-                print(f"[Migrate] Error inserting row into {table_name}: {e}")
-                print(f"[Migrate] Row data: {row}")
-                continue
-        
-        sqlite_conn.commit()
         print(f"[Migrate] Successfully inserted {inserted_count} rows into SQLite {table_name}")
         return inserted_count
         
@@ -183,32 +272,70 @@ def migrate_table(neon_conn, sqlite_conn, table_name, columns, order_by=None):
         sqlite_conn.rollback()
         return 0
     finally:
-        neon_cur.close()
-
-def migrate_domainmodel(neon_conn, sqlite_conn):
-    """Migrate domainmodel table"""
-    columns = ['id', 'name', 'description', 'enterprise', 'facet', 'element', 'image_url', 'created_at', 'updated_at']
-    return migrate_table(neon_conn, sqlite_conn, 'domainmodel', columns, 'id')
+        if rows_iter is not None:
+            rows_iter.close()
 
-def migrate_domainmodelrelationship(neon_conn, sqlite_conn):
-    """Migrate domainmodelrelationship table"""
-    columns = ['id', 'source_element_id', 'target_element_id', 'relationship_type', 'description', 'created_at', 'updated_at']
-    return migrate_table(neon_conn, sqlite_conn, 'domainmodelrelationship', columns, 'id')
+def make_table_migrator(table_name, columns, order_by='id'):
+    """Build the migrate function for one table, with its SQL generated once at import time"""
+    select_query = f'SELECT {", ".join(columns)} FROM "{table_name}"'
+    if order_by:
+        select_query += f' ORDER BY {order_by}'
+    placeholders = ', '.join(['?'] * len(columns))
+    insert_query = f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES ({placeholders})'
+    
+    def migrate(neon_conn, sqlite_conn):
+        return migrate_table(neon_conn, sqlite_conn, table_name, select_query, insert_query)
+    
+    migrate.__name__ = f'migrate_{table_name}'
+    migrate.__doc__ = f'Migrate {table_name} table'
+    return migrate
 
-def migrate_domainelementproperties(neon_conn, sqlite_conn):
-    """Migrate domainelementproperties table"""
-    columns = ['id', 'element_id', 'ragtype', 'propertyname', 'description', 'image_url', 'created_at', 'updated_at']
-    return migrate_table(neon_conn, sqlite_conn, 'domainelementproperties', columns, 'id')
+migrate_domainmodel = make_table_migrator(
+    'domainmodel',
+    ['id', 'name', 'description', 'enterprise', 'facet', 'element', 'image_url', 'created_at', 'updated_at']
+)
+migrate_domainmodelrelationship = make_table_migrator(
+    'domainmodelrelationship',
+    ['id', 'source_element_id', 'target_element_id', 'relationship_type', 'description', 'created_at', 'updated_at']
+)
+migrate_domainelementproperties = make_table_migrator(
+    'domainelementproperties',
+    ['id', 'element_id', 'ragtype', 'propertyname', 'description', 'image_url', 'created_at', 'updated_at']
+)
+migrate_plantumldiagrams = make_table_migrator(
+    'plantumldiagrams',
+    ['id', 'title', 'plantuml_code', 'encoded_url', 'enterprise_filter', 'elements_count', 'relationships_count', 'created_at', 'updated_at']
+)
+migrate_plantumldiagram_elements = make_table_migrator(
+    'plantumldiagram_elements',
+    ['id', 'diagram_id', 'element_id', 'created_at']
+)
 
-def migrate_plantumldiagrams(neon_conn, sqlite_conn):
-    """Migrate plantumldiagrams table"""
-    columns = ['id', 'title', 'plantuml_code', 'encoded_url', 'enterprise_filter', 'elements_count', 'relationships_count', 'created_at', 'updated_at']
-    return migrate_table(neon_conn, sqlite_conn, 'plantumldiagrams', columns, 'id')
+def run_migration(migrate_fn):
+    """Run one table migration on its own Neon and SQLite connections"""
+    neon_conn = get_neon_connection()
+    sqlite_conn = get_sqlite_connection()
+    try:
+        if not neon_conn or not sqlite_conn:
+            print(f"[Error] Could not open connections for {migrate_fn.__name__}")
+            return 0
+        # foreign_keys is per connection, so each worker needs the bulk-load PRAGMAs too
+        sqlite_conn.executescript(BULK_LOAD_PRAGMAS)
+        return migrate_fn(neon_conn, sqlite_conn)
+    finally:
+        if neon_conn:
+            neon_conn.close()
+        if sqlite_conn:
+            sqlite_conn.close()
 
-def migrate_plantumldiagram_elements(neon_conn, sqlite_conn):
-    """Migrate plantumldiagram_elements table"""
-    columns = ['id', 'diagram_id', 'element_id', 'created_at']
-    return migrate_table(neon_conn, sqlite_conn, 'plantumldiagram_elements', columns, 'id')
+def run_migration_step(migrate_fns):
+    """Migrate independent tables concurrently; returns the total rows migrated
+    
+    Threads overlap one table's Neon transfer with another's SQLite inserts (both
+    drivers release the GIL while waiting); SQLite still serializes the commits.
+    """
+    with ThreadPoolExecutor(max_workers=len(migrate_fns)) as pool:
+        return sum(pool.map(run_migration, migrate_fns))
 
 def reset_sqlite_sequences(sqlite_conn):
     """Reset SQLite sequences to continue from highest ID"""
@@ -233,6 +360,17 @@ def reset_sqlite_sequences(sqlite_conn):
     finally:
         sqlite_cur.close()
 
+def verify_foreign_keys(sqlite_conn):
+    """Re-enable foreign keys after the bulk load and report any dangling references"""
+    sqlite_conn.execute('PRAGMA foreign_keys = ON')
+    violations = sqlite_conn.execute('PRAGMA foreign_key_check').fetchall()
+    if violations:
+        tables = sorted({row[0] for row in violations})
+        print(f"[Migrate] Warning: {len(violations)} row(s) with dangling foreign keys in {', '.join(tables)}")
+    else:
+        print("[Migrate] Foreign key check passed")
+    return len(violations)
+
 def main():
     """Main migration function"""
     print("=" * 60)
@@ -263,7 +401,7 @@ def main():
     
     # Initialize SQLite database tables
     print("\n[Init] Initializing SQLite database tables...")
-    if not init_sqlite_database(sqlite_conn):
+    if not init_sqlite_tables(sqlite_conn):
         print("[Error] Failed to initialize SQLite database. Exiting.")
         neon_conn.close()
         sqlite_conn.close()
@@ -292,30 +430,29 @@ def main():
     print("Step 1: Migrating base tables")
     print("=" * 60)
     
-    count = migrate_domainmodel(neon_conn, sqlite_conn)
-    total_migrated += count
-    
-    count = migrate_plantumldiagrams(neon_conn, sqlite_conn)
-    total_migrated += count
+    total_migrated += run_migration_step([migrate_domainmodel, migrate_plantumldiagrams])
     
     # Step 2: Migrate dependent tables
     print("\n" + "=" * 60)
     print("Step 2: Migrating dependent tables")
     print("=" * 60)
     
-    count = migrate_domainmodelrelationship(neon_conn, sqlite_conn)
-    total_migrated += count
-    
-    count = migrate_domainelementproperties(neon_conn, sqlite_conn)
-    total_migrated += count
-    
-    count = migrate_plantumldiagram_elements(neon_conn, sqlite_conn)
-    total_migrated += count
+    total_migrated += run_migration_step([
+        migrate_domainmodelrelationship,
+        migrate_domainelementproperties,
+        migrate_plantumldiagram_elements
+    ])
     
     # Reset sequences
     print("\n[Migrate] Resetting SQLite sequences...")
     reset_sqlite_sequences(sqlite_conn)
     
+    print("\n[Migrate] Creating indexes...")
+    create_sqlite_indexes(sqlite_conn)
+    
+    print("\n[Migrate] Checking foreign keys...")
+    verify_foreign_keys(sqlite_conn)
+    
     # Summary
     print("\n" + "=" * 60)
     print("Migration Summary")
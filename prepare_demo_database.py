@@ -9,6 +9,38 @@ import os
 import shutil
 from pathlib import Path
 
+# Settings for the one-shot load into the new file. The journal stays in
+# memory rather than OFF so the no-demo-elements path can still roll back.
+# threads lets the sorter behind the deferred CREATE INDEX pass use helper threads.
+BULK_LOAD_PRAGMAS = """
+    PRAGMA main.journal_mode = MEMORY;
+    PRAGMA main.synchronous = OFF;
+    PRAGMA main.locking_mode = EXCLUSIVE;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -65536;
+    PRAGMA threads = 4;
+"""
+
+# Tables copied for the Demo enterprise: (table, label, FROM clause selecting its rows as t).
+# Each joins against the demo_ids temp table, so the planner can drive it from either side.
+DEMO_COPIES = (
+    ('domainmodel', 'elements',
+     'FROM demo_ids i JOIN src.domainmodel t ON t.id = i.id'),
+    # Relationships where both source and target are Demo enterprise
+    ('domainmodelrelationship', 'relationships',
+     '''FROM src.domainmodelrelationship t
+        JOIN demo_ids s ON s.id = t.source_element_id
+        JOIN demo_ids g ON g.id = t.target_element_id'''),
+    ('domainelementproperties', 'properties',
+     'FROM src.domainelementproperties t JOIN demo_ids i ON i.id = t.element_id'),
+)
+
+def copy_demo_rows(cur, table, from_sql):
+    """Copy the rows selected by from_sql from src into main.table; returns the row count"""
+    # Schemas match, so SELECT t.* lines up column for column
+    cur.execute(f'INSERT INTO main.{table} SELECT t.* {from_sql}')
+    return cur.rowcount
+
 def prepare_demo_database(source_db='domainmodel.db', output_db='domainmodel_demo.db'):
     """Create a database with only Demo Enterprise elements"""
     
@@ -29,157 +61,98 @@ def prepare_demo_database(source_db='domainmodel.db', output_db='domainmodel_dem
     
     # Create new database
     print(f"Creating filtered database: {output_db}")
-    conn = sqlite3.connect(output_db)
+    # uri=True so the source can be attached read-only below
+    conn = sqlite3.connect(output_db, uri=True)
     cur = conn.cursor()
-    
-    # Get connection to source database
-    source_conn = sqlite3.connect(source_db)
-    source_cur = source_conn.cursor()
+    # PRAGMAs are scoped to main so the attached source keeps its own settings
+    conn.executescript(BULK_LOAD_PRAGMAS)
     
     try:
-        # Copy schema from source database
-        # Read all CREATE TABLE statements from source
-        source_cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = source_cur.fetchall()
+        # Attach the source read-only so rows are copied in SQL without passing
+        # through Python; main is already in exclusive locking mode, so a plain
+        # BEGIN leaves src readable by anything else using it
+        src_uri = Path(source_db).resolve().as_uri() + '?mode=ro'
+        cur.execute('ATTACH DATABASE ? AS src', (src_uri,))
+        cur.execute('BEGIN')
         
-        for (sql,) in tables:
-            if sql:
-                cur.execute(sql)
+        # Copy schema from source database
+        # Read all CREATE TABLE statements from source once; later lookups use this dict
+        cur.execute("SELECT name, sql FROM src.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        schemas = dict(cur.fetchall())
         
-        # Copy indexes
-        source_cur.execute("SELECT sql FROM sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%'")
-        indexes = source_cur.fetchall()
+        # FTS5 tables create their own <name>_data/_idx/... shadow tables, so those are skipped
+        fts_tables = [name for name, sql in schemas.items() if sql and 'USING fts5' in sql]
         
-        for (sql,) in indexes:
-            if sql:
-                try:
-                    cur.execute(sql)
-                except:
-                    pass  # Some indexes may fail if table is empty
+        # Every other table, canvas and rule tables included, is created empty here
+        for name, sql in schemas.items():
+            if sql and not any(name.startswith(fts + '_') for fts in fts_tables):
+                cur.execute(sql)
         
-        conn.commit()
+        # Read index definitions now; they are created once the rows are in
+        cur.execute("SELECT sql FROM src.sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%'")
+        indexes = cur.fetchall()
         
-        # Get all Demo enterprise element IDs (case-insensitive)
-        source_cur.execute('''
-            SELECT id FROM domainmodel 
-            WHERE LOWER(enterprise) = 'demo' OR enterprise = 'Demo'
+        # Collect all Demo enterprise element IDs (case-insensitive) in a temp table
+        cur.execute('CREATE TEMP TABLE demo_ids (id INTEGER PRIMARY KEY) WITHOUT ROWID')
+        cur.execute('''
+            INSERT INTO demo_ids (id)
+            SELECT id FROM src.domainmodel 
+            WHERE LOWER(enterprise) = 'demo'
         ''')
-        demo_element_ids = [row[0] for row in source_cur.fetchall()]
+        demo_count = cur.rowcount
         
-        if not demo_element_ids:
+        if not demo_count:
             print("WARNING: No Demo enterprise elements found!")
             # Check what enterprises exist
-            source_cur.execute('SELECT DISTINCT enterprise FROM domainmodel WHERE enterprise IS NOT NULL')
-            enterprises = [row[0] for row in source_cur.fetchall()]
+            cur.execute('SELECT DISTINCT enterprise FROM src.domainmodel WHERE enterprise IS NOT NULL')
+            enterprises = [row[0] for row in cur.fetchall()]
             print(f"Available enterprises: {enterprises}")
-            source_conn.close()
+            conn.rollback()
             conn.close()
             os.remove(output_db)
             return False
         
-        print(f"Found {len(demo_element_ids)} Demo enterprise elements")
-        
-        # Copy Demo enterprise elements
-        placeholders = ','.join(['?'] * len(demo_element_ids))
-        source_cur.execute(f'SELECT * FROM domainmodel WHERE id IN ({placeholders})', demo_element_ids)
-        elements = source_cur.fetchall()
-        
-        # Get column names
-        source_cur.execute('PRAGMA table_info(domainmodel)')
-        columns = [col[1] for col in source_cur.fetchall()]
-        col_names = ', '.join(columns)
-        placeholders_insert = ', '.join(['?'] * len(columns))
-        
-        for element in elements:
-            cur.execute(f'INSERT INTO domainmodel ({col_names}) VALUES ({placeholders_insert})', element)
-        
-        print(f"Copied {len(elements)} elements")
-        
-        # Copy relationships where both source and target are Demo enterprise
-        source_cur.execute(f'''
-            SELECT r.* FROM domainmodelrelationship r
-            WHERE r.source_element_id IN ({placeholders})
-              AND r.target_element_id IN ({placeholders})
-        ''', demo_element_ids + demo_element_ids)
-        relationships = source_cur.fetchall()
-        
-        if relationships:
-            source_cur.execute('PRAGMA table_info(domainmodelrelationship)')
-            rel_columns = [col[1] for col in source_cur.fetchall()]
-            rel_col_names = ', '.join(rel_columns)
-            rel_placeholders = ', '.join(['?'] * len(rel_columns))
-            
-            for rel in relationships:
-                cur.execute(f'INSERT INTO domainmodelrelationship ({rel_col_names}) VALUES ({rel_placeholders})', rel)
-        
-        print(f"Copied {len(relationships)} relationships")
-        
-        # Copy properties for Demo enterprise elements
-        source_cur.execute(f'''
-            SELECT p.* FROM domainelementproperties p
-            WHERE p.element_id IN ({placeholders})
-        ''', demo_element_ids)
-        properties = source_cur.fetchall()
-        
-        if properties:
-            source_cur.execute('PRAGMA table_info(domainelementproperties)')
-            prop_columns = [col[1] for col in source_cur.fetchall()]
-            prop_col_names = ', '.join(prop_columns)
-            prop_placeholders = ', '.join(['?'] * len(prop_columns))
-            
-            for prop in properties:
-                cur.execute(f'INSERT INTO domainelementproperties ({prop_col_names}) VALUES ({prop_placeholders})', prop)
-        
-        print(f"Copied {len(properties)} properties")
-        
-        # Copy canvas tables if they exist (they should be empty for a fresh install)
-        canvas_tables = [
-            'canvas_models', 'canvas_element_instances', 'canvas_relationships',
-            'canvas_property_instances', 'canvas_template_segments', 'canvas_template_segment_associations'
-        ]
-        
-        for table_name in canvas_tables:
-            try:
-                source_cur.execute(f'SELECT sql FROM sqlite_master WHERE type="table" AND name=?', (table_name,))
-                result = source_cur.fetchone()
-                if result and result[0]:
-                    cur.execute(result[0])
-                    conn.commit()
-            except:
-                pass
-        
-        # Copy other tables that might exist (empty for demo)
-        other_tables = [
-            'plantumldiagrams', 'plantumldiagram_elements',
-            'design_rules', 'design_rule_violations', 'audit_log'
-        ]
-        
-        for table_name in other_tables:
-            try:
-                source_cur.execute(f'SELECT sql FROM sqlite_master WHERE type="table" AND name=?', (table_name,))
-                result = source_cur.fetchone()
-                if result and result[0]:
-                    cur.execute(result[0])
-                    conn.commit()
-            except:
-                pass
+        print(f"Found {demo_count} Demo enterprise elements")
+        
+        # Copy Demo enterprise elements, their relationships and their properties
+        for table, label, from_sql in DEMO_COPIES:
+            print(f"Copied {copy_demo_rows(cur, table, from_sql)} {label}")
+        
+        # Copy indexes, built in one pass over the loaded tables
+        for (sql,) in indexes:
+            if sql:
+                try:
+                    cur.execute(sql)
+                except:
+                    pass  # Some indexes may fail if table is empty
+        
+        # Full-text sync triggers go in after the copy; the indexes are then filled in one pass
+        cur.execute("SELECT sql FROM src.sqlite_master WHERE type='trigger'")
+        for (sql,) in cur.fetchall():
+            cur.execute(sql)
+        for fts in fts_tables:
+            cur.execute(f"INSERT INTO main.{fts}({fts}) VALUES ('rebuild')")
         
         conn.commit()
         
+        # Switch the finished file to the settings the app runs with
+        cur.execute('DETACH DATABASE src')
+        cur.execute('PRAGMA main.journal_mode = WAL')
+        cur.execute('PRAGMA main.synchronous = NORMAL')
+        cur.execute('ANALYZE')
+        
         # Verify the database
-        cur.execute('SELECT COUNT(*) FROM domainmodel')
-        element_count = cur.fetchone()[0]
-        cur.execute('SELECT COUNT(*) FROM domainmodelrelationship')
-        rel_count = cur.fetchone()[0]
-        cur.execute('SELECT COUNT(*) FROM domainelementproperties')
-        prop_count = cur.fetchone()[0]
+        element_count, rel_count, prop_count = cur.execute('''
+            SELECT (SELECT COUNT(*) FROM domainmodel),
+                   (SELECT COUNT(*) FROM domainmodelrelationship),
+                   (SELECT COUNT(*) FROM domainelementproperties)
+        ''').fetchone()
         
         print(f"\nDatabase prepared successfully!")
         print(f"  Elements: {element_count}")
         print(f"  Relationships: {rel_count}")
         print(f"  Properties: {prop_count}")
         
-        source_conn.close()
         conn.close()
         
         return True
@@ -188,7 +161,6 @@ def prepare_demo_database(source_db='domainmodel.db', output_db='domainmodel_dem
         print(f"ERROR: {e}")
         import traceback
         traceback.print_exc()
-        source_conn.close()
         conn.close()
         if os.path.exists(output_db):
             os.remove(output_db)
@@ -7,179 +7,118 @@ Duplicates are identified by: propertyname, ragtype, description, image_url (and
 import sqlite3
 import sys
 
-DB_PATH = 'domainmodel.db'
+from db_common import DB_PATH, get_db_connection, close_db_connection
 
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    try:
-        conn = sqlite3.connect(DB_PATH, timeout=10.0)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+# Columns that identify a duplicate; element_id is added with --include-element-id
+DUPLICATE_KEY_COLUMNS = ('propertyname', 'ragtype', 'description', 'image_url')
 
-def find_duplicates(include_element_id=False):
-    """Find duplicate properties"""
-    conn = get_db_connection()
-    if not conn:
-        return []
-    
-    try:
-        cur = conn.cursor()
-        
-        if include_element_id:
-            # Find duplicates including element_id
-            cur.execute('''
-                SELECT propertyname, ragtype, description, image_url, element_id, COUNT(*) as count
-                FROM domainelementproperties
-                GROUP BY propertyname, ragtype, description, image_url, element_id
-                HAVING COUNT(*) > 1
-                ORDER BY count DESC, propertyname
-            ''')
-        else:
-            # Find duplicates ignoring element_id (template properties)
-            cur.execute('''
-                SELECT propertyname, ragtype, description, image_url, COUNT(*) as count
-                FROM domainelementproperties
-                GROUP BY propertyname, ragtype, description, image_url
-                HAVING COUNT(*) > 1
-                ORDER BY count DESC, propertyname
-            ''')
-        
-        duplicates = cur.fetchall()
-        return duplicates
-    except Exception as e:
-        print(f"Error finding duplicates: {e}")
-        return []
-    finally:
-        conn.close()
+def duplicate_key(include_element_id=False):
+    """Return the PARTITION BY column list for the duplicate key"""
+    columns = DUPLICATE_KEY_COLUMNS + (('element_id',) if include_element_id else ())
+    return ', '.join(columns)
 
-def get_duplicate_records(propertyname, ragtype, description, image_url, element_id=None):
-    """Get all records matching the duplicate criteria"""
-    conn = get_db_connection()
-    if not conn:
-        return []
-    
+def ranked_duplicates_sql(include_element_id=False, keep_oldest=True):
+    """CTE ranking each row within its duplicate group; rn = 1 is the record to keep"""
+    key = duplicate_key(include_element_id)
+    order = 'ASC' if keep_oldest else 'DESC'
+    # Window partitions treat NULLs as equal, matching GROUP BY
+    return f'''
+        WITH ranked AS (
+            SELECT id, element_id, propertyname, ragtype, description, image_url, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY id {order}) AS rn,
+                   COUNT(*) OVER (PARTITION BY {key}) AS cnt
+            FROM domainelementproperties
+        )
+    '''
+
+def find_duplicates(conn, include_element_id=False, keep_oldest=True):
+    """Return every record in a duplicate group, grouped together and ordered by id"""
     try:
         cur = conn.cursor()
-        
-        if element_id is not None:
-            cur.execute('''
-                SELECT id, element_id, propertyname, ragtype, description, image_url, created_at
-                FROM domainelementproperties
-                WHERE propertyname = ? 
-                AND (ragtype = ? OR (ragtype IS NULL AND ? IS NULL))
-                AND (description = ? OR (description IS NULL AND ? IS NULL))
-                AND (image_url = ? OR (image_url IS NULL AND ? IS NULL))
-                AND (element_id = ? OR (element_id IS NULL AND ? IS NULL))
-                ORDER BY id ASC
-            ''', (propertyname, ragtype, ragtype, description, description, image_url, image_url, element_id, element_id))
-        else:
-            cur.execute('''
-                SELECT id, element_id, propertyname, ragtype, description, image_url, created_at
-                FROM domainelementproperties
-                WHERE propertyname = ? 
-                AND (ragtype = ? OR (ragtype IS NULL AND ? IS NULL))
-                AND (description = ? OR (description IS NULL AND ? IS NULL))
-                AND (image_url = ? OR (image_url IS NULL AND ? IS NULL))
-                ORDER BY id ASC
-            ''', (propertyname, ragtype, ragtype, description, description, image_url, image_url))
-        
+        cur.execute(ranked_duplicates_sql(include_element_id, keep_oldest) + f'''
+            SELECT * FROM ranked
+            WHERE cnt > 1
+            ORDER BY cnt DESC, {duplicate_key(include_element_id)}, id
+        ''')
         return cur.fetchall()
     except Exception as e:
-        print(f"Error getting duplicate records: {e}")
+        print(f"Error finding duplicates: {e}")
         return []
-    finally:
-        conn.close()
 
-def delete_duplicates(keep_oldest=True, include_element_id=False, dry_run=True):
+def group_duplicates(records, include_element_id=False):
+    """Split the rows from find_duplicates into one list per duplicate group"""
+    columns = DUPLICATE_KEY_COLUMNS + (('element_id',) if include_element_id else ())
+    groups = []
+    previous_key = None
+    for record in records:
+        key = tuple(record[column] for column in columns)
+        if not groups or key != previous_key:
+            groups.append([])
+            previous_key = key
+        groups[-1].append(record)
+    return groups
+
+def delete_duplicates(conn, keep_oldest=True, include_element_id=False, dry_run=True):
     """Delete duplicate records, keeping the oldest (or newest) one"""
-    conn = get_db_connection()
-    if not conn:
-        return
-    
     try:
         cur = conn.cursor()
-        duplicates = find_duplicates(include_element_id)
+        if not dry_run:
+            # Hold the write lock from the scan on, so the ids reported are the ids deleted
+            cur.execute('BEGIN IMMEDIATE')
+        groups = group_duplicates(find_duplicates(conn, include_element_id, keep_oldest), include_element_id)
         
-        if not duplicates:
+        if not groups:
             print("No duplicates found!")
+            conn.rollback()
             return
         
-        print(f"\nFound {len(duplicates)} duplicate groups:")
+        print(f"\nFound {len(groups)} duplicate groups:")
         print("=" * 80)
         
-        total_deleted = 0
+        delete_ids = []
         
-        for dup in duplicates:
-            if include_element_id:
-                propertyname, ragtype, description, image_url, element_id, count = dup
-            else:
-                propertyname, ragtype, description, image_url, count = dup
-                element_id = None
-            
-            print(f"\nDuplicate group ({count} records):")
-            print(f"  Property Name: {propertyname}")
-            print(f"  RAG Type: {ragtype}")
-            print(f"  Description: {description}")
-            print(f"  Image URL: {image_url}")
+        for records in groups:
+            first = records[0]
+            print(f"\nDuplicate group ({len(records)} records):")
+            print(f"  Property Name: {first['propertyname']}")
+            print(f"  RAG Type: {first['ragtype']}")
+            print(f"  Description: {first['description']}")
+            print(f"  Image URL: {first['image_url']}")
             if include_element_id:
-                print(f"  Element ID: {element_id}")
+                print(f"  Element ID: {first['element_id']}")
             
-            # Get all records in this duplicate group
-            records = get_duplicate_records(propertyname, ragtype, description, image_url, element_id)
-            
-            if len(records) <= 1:
-                continue
-            
-            # Keep the first (oldest) or last (newest) record
-            if keep_oldest:
-                keep_record = records[0]
-                delete_records = records[1:]
-            else:
-                keep_record = records[-1]
-                delete_records = records[:-1]
+            # rn = 1 marks the oldest (or newest) record, which is kept
+            keep_record = next(record for record in records if record['rn'] == 1)
+            delete_records = [record for record in records if record['rn'] > 1]
             
             print(f"  Keeping record ID: {keep_record['id']} (created: {keep_record['created_at']})")
             print(f"  Deleting {len(delete_records)} duplicate(s):")
             
             for record in delete_records:
                 print(f"    - ID: {record['id']} (created: {record['created_at']})")
-                
-                if not dry_run:
-                    # Check if this property is used in canvas_property_instances
-                    cur.execute('''
-                        SELECT COUNT(*) FROM canvas_property_instances 
-                        WHERE property_id = ?
-                    ''', (record['id'],))
-                    usage_count = cur.fetchone()[0]
-                    
-                    if usage_count > 0:
-                        print(f"      WARNING: This property is used in {usage_count} canvas instance(s). Skipping deletion.")
-                        continue
-                    
-                    # Delete the duplicate record
-                    cur.execute('DELETE FROM domainelementproperties WHERE id = ?', (record['id'],))
-                    total_deleted += 1
+            delete_ids.extend((record['id'],) for record in delete_records)
             
             print()
         
+        would_delete = len(delete_ids)
+        
         if not dry_run:
-            conn.commit()
+            # Materialize the candidates already scanned with one prepared INSERT, then
+            # delete them in one statement; properties used on a canvas are left in place
+            cur.execute('CREATE TEMP TABLE to_delete (id INTEGER PRIMARY KEY)')
+            cur.executemany('INSERT INTO to_delete (id) VALUES (?)', delete_ids)
+            cur.execute('''
+                DELETE FROM domainelementproperties
+                WHERE id IN (SELECT id FROM to_delete)
+                  AND id NOT IN (SELECT property_id FROM canvas_property_instances WHERE property_id IS NOT NULL)
+            ''')
+            total_deleted = cur.execute('SELECT changes()').fetchone()[0]
+            cur.execute('DROP TABLE to_delete')
+            cur.execute('COMMIT')
+            if total_deleted < would_delete:
+                print(f"WARNING: Skipped {would_delete - total_deleted} duplicate(s) still used in canvas instances.")
             print(f"\nSUCCESS: Deleted {total_deleted} duplicate record(s)")
         else:
-            # Calculate total that would be deleted
-            would_delete = 0
-            for dup in duplicates:
-                if include_element_id:
-                    propertyname, ragtype, description, image_url, element_id, count = dup
-                else:
-                    propertyname, ragtype, description, image_url, count = dup
-                    element_id = None
-                records = get_duplicate_records(propertyname, ragtype, description, image_url, element_id)
-                would_delete += len(records) - 1  # Keep one, delete the rest
-            
             print(f"\n[DRY RUN] Would delete {would_delete} duplicate record(s)")
             print("\nTo actually delete duplicates, run with --execute flag")
         
@@ -187,10 +126,7 @@ def delete_duplicates(keep_oldest=True, include_element_id=False, dry_run=True):
         print(f"Error deleting duplicates: {e}")
         import traceback
         traceback.print_exc()
-        if conn:
-            conn.rollback()
-    finally:
-        conn.close()
+        conn.rollback()
 
 def main():
     import argparse
@@ -199,13 +135,10 @@ def main():
     parser.add_argument('--execute', action='store_true', help='Actually delete duplicates (default is dry run)')
     parser.add_argument('--include-element-id', action='store_true', help='Consider element_id when identifying duplicates')
     parser.add_argument('--keep-newest', action='store_true', help='Keep newest record instead of oldest')
-    parser.add_argument('--db-path', default='domainmodel.db', help='Path to database file')
+    parser.add_argument('--db-path', default=DB_PATH, help='Path to database file')
     
     args = parser.parse_args()
     
-    global DB_PATH
-    DB_PATH = args.db_path
-    
     print("=" * 80)
     print("Duplicate Property Removal Tool")
     print("=" * 80)
@@ -219,11 +152,22 @@ def main():
     else:
         print("\n[DRY RUN MODE] No changes will be made. Use --execute to actually delete.")
     
-    delete_duplicates(
-        keep_oldest=not args.keep_newest,
-        include_element_id=args.include_element_id,
-        dry_run=not args.execute
-    )
+    # One connection for the whole run, so the page cache stays warm between queries
+    try:
+        conn = get_db_connection(args.db_path)
+    except sqlite3.Error as e:
+        print(f"Database connection error: {e}")
+        return
+    
+    try:
+        delete_duplicates(
+            conn,
+            keep_oldest=not args.keep_newest,
+            include_element_id=args.include_element_id,
+            dry_run=not args.execute
+        )
+    finally:
+        close_db_connection(args.db_path)
 
 if __name__ == '__main__':
     main()
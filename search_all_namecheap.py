@@ -3,67 +3,94 @@
 Script to search for Namecheap in all fields of all elements
 """
 
-import sqlite3
-import os
+from db_common import get_db_connection, close_db_connection
 
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
-
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    return conn
+def has_text_index(cur):
+    """True if the domainmodel_fts trigram index from fix_property_schema.py covers all three fields"""
+    cur.execute("SELECT COUNT(*) FROM pragma_table_info('domainmodel_fts') WHERE name IN ('name', 'description', 'enterprise')")
+    return cur.fetchone()[0] == 3
 
 def search_all_fields():
-    """Search for Namecheap in all fields"""
-    conn = get_db_connection()
+    """Search for Namecheap in all fields, streaming rows from the cursor; returns the count"""
+    # Shared read-only connection: repeated searches reuse its warm page cache
+    conn = get_db_connection(read_only=True)
     cur = conn.cursor()
+    use_fts = has_text_index(cur)
     
-    # Search in name, description, enterprise fields
-    cur.execute('''
-        SELECT id, name, enterprise, facet, element, description, created_at
-        FROM domainmodel
-        WHERE LOWER(name) LIKE '%namecheap%' 
-           OR LOWER(description) LIKE '%namecheap%'
-           OR LOWER(enterprise) LIKE '%namecheap%'
-        ORDER BY id
-    ''')
+    # Search in name, description, enterprise fields. The trigram index answers the
+    # case-insensitive substring match without scanning; fall back to LIKE if it is missing.
+    # LIKE already folds ASCII case, so the fallback compares without building LOWER() copies.
+    if use_fts:
+        cur.execute('''
+            SELECT d.id, d.name, d.enterprise, d.facet, d.element, d.description, d.created_at
+            FROM domainmodel_fts f
+            JOIN domainmodel d ON d.id = f.rowid
+            WHERE domainmodel_fts MATCH '"namecheap"'
+            ORDER BY d.id
+        ''')
+    else:
+        cur.execute('''
+            SELECT id, name, enterprise, facet, element, description, created_at
+            FROM domainmodel
+            WHERE name LIKE '%namecheap%' COLLATE NOCASE
+               OR description LIKE '%namecheap%' COLLATE NOCASE
+               OR enterprise LIKE '%namecheap%' COLLATE NOCASE
+            ORDER BY id
+        ''')
     
-    records = cur.fetchall()
+    # Print each row as it is stepped instead of buffering them all; the total follows
+    total = 0
+    # Unpack positionally rather than looking each column up by name
+    for rid, rname, renterprise, rfacet, relem, rdesc, rcreated in cur:
+        if not total:
+            print("-" * 80)
+        total += 1
+        print(f"ID: {rid}")
+        print(f"  Name: {rname}")
+        print(f"  Element Type: {relem}")
+        print(f"  Enterprise: {renterprise}")
+        print(f"  Facet: {rfacet}")
+        print(f"  Description: {(rdesc[:100] + '...') if rdesc else 'N/A'}")
+        print("-" * 80)
     
-    if not records:
+    if not total:
         print("No elements found with 'namecheap' in any field!")
         print("\nSearching for similar names...")
         # Try searching for similar patterns
-        cur.execute('''
-            SELECT id, name, enterprise, facet, element, description
-            FROM domainmodel
-            WHERE LOWER(name) LIKE '%name%' AND LOWER(name) LIKE '%cheap%'
-            ORDER BY id
-        ''')
-        similar = cur.fetchall()
+        if use_fts:
+            cur.execute('''
+                SELECT d.id, d.name, d.enterprise, d.facet, d.element, d.description
+                FROM domainmodel_fts f
+                JOIN domainmodel d ON d.id = f.rowid
+                WHERE domainmodel_fts MATCH 'name : ("name" AND "cheap")'
+                ORDER BY d.id
+            ''')
+        else:
+            cur.execute('''
+                SELECT id, name, enterprise, facet, element, description
+                FROM domainmodel
+                WHERE name LIKE '%name%' COLLATE NOCASE AND name LIKE '%cheap%' COLLATE NOCASE
+                ORDER BY id
+            ''')
+        similar = 0
+        for rec in cur:
+            if not similar:
+                print("\nElement(s) with 'name' and 'cheap' in name:")
+            similar += 1
+            print(f"  ID: {rec['id']} | Name: {rec['name']} | Element: {rec['element']}")
         if similar:
-            print(f"\nFound {len(similar)} element(s) with 'name' and 'cheap' in name:")
-            for rec in similar:
-                print(f"  ID: {rec['id']} | Name: {rec['name']} | Element: {rec['element']}")
+            print(f"\nFound {similar} element(s) with 'name' and 'cheap' in name")
     else:
-        print(f"Found {len(records)} element(s) with 'namecheap' in any field:")
-        print("-" * 80)
-        for record in records:
-            print(f"ID: {record['id']}")
-            print(f"  Name: {record['name']}")
-            print(f"  Element Type: {record['element']}")
-            print(f"  Enterprise: {record['enterprise']}")
-            print(f"  Facet: {record['facet']}")
-            print(f"  Description: {record['description'][:100] if record['description'] else 'N/A'}...")
-            print("-" * 80)
+        print(f"Found {total} element(s) with 'namecheap' in any field")
     
-    conn.close()
-    return records
+    return total
 
 if __name__ == '__main__':
     print("=" * 80)
     print("Searching for Namecheap in all fields")
     print("=" * 80)
-    search_all_fields()
+    try:
+        search_all_fields()
+    finally:
+        close_db_connection(read_only=True)
 
@@ -3,52 +3,49 @@
 Script to search for Namecheap-related elements in the database
 """
 
-import sqlite3
-import os
-
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
-
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    return conn
+from db_common import get_db_connection, close_db_connection
 
 def search_namecheap():
-    """Search for any Namecheap-related elements"""
-    conn = get_db_connection()
+    """Search for any Namecheap-related elements, streaming rows from the cursor; returns the count"""
+    # Shared read-only connection: repeated searches reuse its warm page cache
+    conn = get_db_connection(read_only=True)
     cur = conn.cursor()
     
-    # Search for any element with Namecheap in the name
+    # Search for any element with Namecheap in the name (LIKE ignores ASCII case)
     cur.execute('''
         SELECT id, name, enterprise, facet, element, created_at
         FROM domainmodel
-        WHERE name LIKE '%Namecheap%' OR name LIKE '%namecheap%'
+        WHERE name LIKE '%namecheap%' COLLATE NOCASE
         ORDER BY id
     ''')
     
-    records = cur.fetchall()
+    # Print each row as it is stepped instead of buffering them all; the total follows
+    total = 0
+    for record in cur:
+        if not total:
+            print("-" * 80)
+        total += 1
+        print(f"ID: {record['id']}")
+        print(f"  Name: {record['name']}")
+        print(f"  Element Type: {record['element']}")
+        print(f"  Enterprise: {record['enterprise']}")
+        print(f"  Facet: {record['facet']}")
+        print(f"  Created: {record['created_at']}")
+        print("-" * 80)
     
-    if not records:
+    if not total:
         print("No Namecheap-related elements found!")
     else:
-        print(f"Found {len(records)} Namecheap-related element(s):")
-        print("-" * 80)
-        for record in records:
-            print(f"ID: {record['id']}")
-            print(f"  Name: {record['name']}")
-            print(f"  Element Type: {record['element']}")
-            print(f"  Enterprise: {record['enterprise']}")
-            print(f"  Facet: {record['facet']}")
-            print(f"  Created: {record['created_at']}")
-            print("-" * 80)
+        print(f"Found {total} Namecheap-related element(s)")
     
-    conn.close()
-    return records
+    return total
 
 if __name__ == '__main__':
     print("=" * 80)
     print("Searching for Namecheap-related elements")
     print("=" * 80)
-    search_namecheap()
+    try:
+        search_namecheap()
+    finally:
+        close_db_connection(read_only=True)
 
@@ -6,6 +6,7 @@ SQLite is built into Python, no additional package needed.
 """
 
 from flask import Flask, request, jsonify, send_from_directory, g, has_app_context
+from werkzeug.middleware.shared_data import SharedDataMiddleware
 from flask_cors import CORS
 import sqlite3
 import os
@@ -14,15 +15,27 @@ import uuid
 import secrets
 import hashlib
 import hmac
-from datetime import datetime, timedelta
+from datetime import datetime
 import zlib
 import base64
 import logging
 import math
-from collections import deque
+import time
+import atexit
+import threading
+import weakref
+from collections import deque, defaultdict, OrderedDict
 from urllib.parse import urlparse
+from functools import lru_cache
 import json
 
+# orjson parses rule conditions several times faster when installed; stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 app = Flask(__name__, static_folder='.')
 app.static_folder = 'public'
 CORS(app)
@@ -65,27 +78,110 @@ AUTH_DB_PATH = os.getenv('AUTH_DB_PATH', os.path.join(APP_DATA_DIR, 'auth.db'))
 USER_DB_DIR = os.getenv('USER_DB_DIR', os.path.join(APP_DATA_DIR, 'user_dbs'))
 AUTH_TOKEN_TTL_HOURS = int(os.getenv('AUTH_TOKEN_TTL_HOURS', '24'))
 AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'true').lower() != 'false'
+# API paths that are reachable without a bearer token
+AUTH_EXEMPT_PATHS = frozenset({'/api/auth/register', '/api/auth/login'})
 CE_LIMITS_ENABLED = os.getenv('CE_LIMITS_ENABLED', 'true').lower() != 'false'
 CE_MAX_MODELS = int(os.getenv('CE_MAX_MODELS', '5'))
 CE_MAX_ELEMENT_OCCURRENCES = int(os.getenv('CE_MAX_ELEMENT_OCCURRENCES', '200'))
+# Tables whose row counts are kept in the counters table for the limit checks
+COUNTED_TABLES = ('canvas_models', 'canvas_element_instances')
+
+# Database files already switched to WAL. journal_mode=WAL is persistent in the file,
+# so it is issued once per path; the other PRAGMAs are per connection.
+_wal_db_paths = set()
+
+# Memory-mapped reads skip the copy from the OS page cache; capped lower on 32-bit
+# builds where address space is scarce
+MMAP_SIZE = 268435456 if sys.maxsize > 2 ** 32 else 67108864  # 256 MiB / 64 MiB
+
+def apply_connection_pragmas(conn, db_path):
+    """Apply the per-connection PRAGMAs, enabling WAL on first use of db_path"""
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('PRAGMA busy_timeout = 10000')  # 10 seconds
+    # An in-memory database has no journal file to switch
+    if db_path not in _wal_db_paths and db_path != ':memory:':
+        # Only takes effect for a new, empty file, and must come before the switch to WAL
+        conn.execute('PRAGMA page_size = 8192')
+        # Readers no longer block behind the writer, and commits append to the WAL
+        conn.execute('PRAGMA journal_mode = WAL')
+        _wal_db_paths.add(db_path)
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -20000')  # 20 MB
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection kept open in the per-thread pool.
+    
+    close() hands the connection back instead of closing it. When the last
+    checkout in this thread is handed back, any open transaction is rolled
+    back and foreign keys are switched back on, so the next caller starts clean.
+    """
+    checkouts = 0
+
+    def close(self):
+        self.checkouts = max(self.checkouts - 1, 0)
+        if not self.checkouts:
+            self.reset()
+
+    def reset(self):
+        if self.in_transaction:
+            self.rollback()
+        self.execute('PRAGMA foreign_keys = ON')
+
+# One open connection per thread and database path
+# Weak references, so a connection is freed with its thread (the Flask dev server
+# starts a thread per request) and only live ones are left to close at exit
+_pool = threading.local()
+_pooled_connections = weakref.WeakSet()
+_pooled_connections_lock = threading.Lock()
+
+def get_pooled_connection(db_path):
+    """Return this thread's connection to db_path, opening it on first use"""
+    conns = getattr(_pool, 'conns', None)
+    if conns is None:
+        conns = _pool.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        # Use check_same_thread=False so the exit handler can close it
+        # Set timeout to handle locked database
+        # A larger statement cache, since the connection is reused for every endpoint's queries
+        conn = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False, factory=PooledConnection,
+                               cached_statements=256)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        # Foreign keys, busy timeout, WAL and cache settings
+        apply_connection_pragmas(conn, db_path)
+        conns[db_path] = conn
+        with _pooled_connections_lock:
+            _pooled_connections.add(conn)
+    conn.checkouts += 1
+    return conn
+
+@app.teardown_appcontext
+def release_pooled_connections(exc=None):
+    """Reset this thread's pooled connections at the end of each request"""
+    for conn in getattr(_pool, 'conns', {}).values():
+        conn.checkouts = 0
+        try:
+            conn.reset()
+        except sqlite3.Error:
+            pass
+
+@atexit.register
+def close_pooled_connections():
+    with _pooled_connections_lock:
+        for conn in list(_pooled_connections):
+            sqlite3.Connection.close(conn)
 
 def get_db_connection(db_path=None):
-    """Create and return a SQLite database connection"""
+    """Return a SQLite database connection from the per-thread pool"""
     try:
         resolved_path = db_path
         if resolved_path is None and has_app_context():
             resolved_path = getattr(g, 'user_db_path', None)
         if not resolved_path:
             resolved_path = DB_PATH
-        # Use check_same_thread=False to allow multi-threaded access
-        # Set timeout to handle locked database
-        conn = sqlite3.connect(resolved_path, timeout=10.0, check_same_thread=False)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access
-        # Enable foreign keys
-        conn.execute('PRAGMA foreign_keys = ON')
-        # Set busy timeout
-        conn.execute('PRAGMA busy_timeout = 10000')  # 10 seconds
-        return conn
+        return get_pooled_connection(resolved_path)
     except Exception as e:
         print(f"Database connection error: {e}")
         import traceback
@@ -93,13 +189,9 @@ def get_db_connection(db_path=None):
         return None
 
 def get_auth_connection():
-    """Create and return a SQLite connection for auth data"""
+    """Return a SQLite connection for auth data from the per-thread pool"""
     try:
-        conn = sqlite3.connect(AUTH_DB_PATH, timeout=10.0, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        conn.execute('PRAGMA foreign_keys = ON')
-        conn.execute('PRAGMA busy_timeout = 10000')
-        return conn
+        return get_pooled_connection(AUTH_DB_PATH)
     except Exception as e:
         print(f"Auth database connection error: {e}")
         import traceback
@@ -113,6 +205,8 @@ def init_auth_database():
         return False
     try:
         cur = conn.cursor()
+        # One transaction, so the DDL below commits once instead of once per statement
+        cur.execute('BEGIN')
         cur.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id TEXT PRIMARY KEY,
@@ -138,7 +232,17 @@ def init_auth_database():
         ''')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON user_sessions(user_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_sessions_token_hash ON user_sessions(token_hash)')
+        # Sessions are looked up by the token's public prefix; token_hash holds sha256 of the secret part
+        cur.execute('DROP INDEX IF EXISTS idx_sessions_token_hash')
+        cur.execute('PRAGMA table_info(user_sessions)')
+        if 'token_prefix' not in {col[1] for col in cur.fetchall()}:
+            cur.execute('ALTER TABLE user_sessions ADD COLUMN token_prefix TEXT')
+        # The prefix is the lookup key of every session query, so it is kept unique. That
+        # costs one extra table read per lookup, but SQLite plans the lookup on the unique
+        # index even when a covering one exists, so the covering index only slowed writes
+        # and is dropped.
+        cur.execute('DROP INDEX IF EXISTS idx_sessions_token_cover')
+        cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_token_prefix ON user_sessions(token_prefix)')
         conn.commit()
         cur.close()
         conn.close()
@@ -149,43 +253,78 @@ def init_auth_database():
             conn.close()
         return False
 
+# scrypt cost parameters for new password hashes; they are stored with each hash
+# ($scrypt$n=...,r=...,p=...$salt$hash) so they can change without breaking old ones
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
 def hash_password(password):
     salt = secrets.token_bytes(16)
-    hashed = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 120000)
-    return f"{base64.b64encode(salt).decode('utf-8')}${base64.b64encode(hashed).decode('utf-8')}"
+    hashed = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return (f"$scrypt$n={SCRYPT_N},r={SCRYPT_R},p={SCRYPT_P}"
+            f"${base64.b64encode(salt).decode('utf-8')}${base64.b64encode(hashed).decode('utf-8')}")
 
 def verify_password(password, stored_hash):
+    """Check a password against a scrypt hash, or a legacy PBKDF2 salt$hash value"""
+    password_bytes = password.encode('utf-8')
     try:
-        salt_b64, hash_b64 = stored_hash.split('$', 1)
-        salt = base64.b64decode(salt_b64.encode('utf-8'))
-        expected = base64.b64decode(hash_b64.encode('utf-8'))
+        if stored_hash.startswith('$scrypt$'):
+            _, _, params, salt_b64, hash_b64 = stored_hash.split('$')
+            cost = dict(item.split('=', 1) for item in params.split(','))
+            salt = base64.b64decode(salt_b64.encode('utf-8'))
+            expected = base64.b64decode(hash_b64.encode('utf-8'))
+            computed = hashlib.scrypt(password_bytes, salt=salt, n=int(cost['n']), r=int(cost['r']),
+                                      p=int(cost['p']), dklen=len(expected))
+        else:
+            # Legacy PBKDF2-SHA256 hashes, kept so existing users can still log in
+            salt_b64, hash_b64 = stored_hash.split('$', 1)
+            salt = base64.b64decode(salt_b64.encode('utf-8'))
+            expected = base64.b64decode(hash_b64.encode('utf-8'))
+            computed = hashlib.pbkdf2_hmac('sha256', password_bytes, salt, 120000)
     except Exception:
         return False
-    computed = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 120000)
     return hmac.compare_digest(computed, expected)
 
+# Statements on the per-request path. Pooled connections live across requests, so
+# reusing the same SQL text hits each connection's prepared-statement cache.
+SQL_INSERT_SESSION = '''
+    INSERT INTO user_sessions (id, user_id, token_prefix, token_hash, expires_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_SELECT_SESSION = '''
+    SELECT s.user_id, s.token_hash, s.expires_at, u.email, u.full_name, u.is_active
+    FROM user_sessions s
+    JOIN users u ON s.user_id = u.id
+    WHERE s.token_prefix = ?
+'''
+SQL_DELETE_SESSION = 'DELETE FROM user_sessions WHERE token_prefix = ?'
+SQL_UPDATE_SESSION_USE = 'UPDATE user_sessions SET last_used_at = ? WHERE token_prefix = ?'
+SQL_SELECT_COUNTER = 'SELECT value FROM counters WHERE key = ?'
+
 def hash_token(token):
     return hashlib.sha256(token.encode('utf-8')).hexdigest()
 
 def create_session(conn, user_id):
-    token = secrets.token_urlsafe(32)
-    token_hash = hash_token(token)
-    session_id = str(uuid.uuid4())
-    expires_at = datetime.utcnow() + timedelta(hours=AUTH_TOKEN_TTL_HOURS)
-    conn.execute('''
-        INSERT INTO user_sessions (id, user_id, token_hash, expires_at)
-        VALUES (?, ?, ?, ?)
-    ''', (session_id, user_id, token_hash, expires_at.isoformat()))
-    return token
+    """Store a new session and return its "<prefix>.<secret>" bearer token"""
+    # One read from the OS RNG, split into the opaque session id, the token prefix
+    # (the indexed lookup key) and the secret, of which only a hash is stored
+    raw = secrets.token_bytes(60)
+    session_id = raw[:16].hex()
+    token_prefix = base64.urlsafe_b64encode(raw[16:28]).decode('ascii')
+    token_secret = base64.urlsafe_b64encode(raw[28:]).rstrip(b'=').decode('ascii')
+    expires_at = datetime.utcfromtimestamp(time.time() + AUTH_TOKEN_TTL_HOURS * 3600).isoformat()
+    conn.execute(SQL_INSERT_SESSION, (session_id, user_id, token_prefix, hash_token(token_secret), expires_at))
+    return f"{token_prefix}.{token_secret}"
 
 def extract_bearer_token():
-    auth_header = request.headers.get('Authorization', '')
+    auth_header = request.headers.get('Authorization')
     if not auth_header:
         return None
-    parts = auth_header.split(' ')
-    if len(parts) != 2 or parts[0].lower() != 'bearer':
+    scheme, sep, token = auth_header.partition(' ')
+    if not sep or ' ' in token or scheme.lower() != 'bearer':
         return None
-    return parts[1].strip()
+    return token.strip()
 
 def ensure_seeded_user_database(user_db_path):
     """Ensure a user database has seed elements/relationships/properties."""
@@ -194,9 +333,10 @@ def ensure_seeded_user_database(user_db_path):
         return False
     try:
         cur = conn.cursor()
-        cur.execute('SELECT COUNT(*) FROM domainmodel')
-        element_count = cur.fetchone()[0]
-        if element_count == 0 and DB_PATH and os.path.exists(DB_PATH):
+        # Stops at the first row instead of counting them all
+        cur.execute('SELECT EXISTS (SELECT 1 FROM domainmodel)')
+        has_elements = cur.fetchone()[0]
+        if not has_elements and DB_PATH and os.path.exists(DB_PATH):
             copy_seed_database_data(conn, DB_PATH)
         cur.close()
         conn.close()
@@ -209,58 +349,143 @@ def ensure_seeded_user_database(user_db_path):
             pass
         return False
 
+# Users whose database has been created and seeded by this process
+_ready_user_dbs = set()
+_ready_user_dbs_lock = threading.Lock()
+
 def ensure_user_database(user_id):
-    os.makedirs(USER_DB_DIR, exist_ok=True)
     user_db_path = os.path.join(USER_DB_DIR, f"user_{user_id}.db")
-    if not os.path.exists(user_db_path):
-        init_database(db_path=user_db_path)
-    else:
-        ensure_seeded_user_database(user_db_path)
+    # Already checked by this process: skip the filesystem probes and the seed query
+    if user_id in _ready_user_dbs:
+        return user_db_path
+    # The lock also keeps two first requests from initializing the same database at once
+    with _ready_user_dbs_lock:
+        if user_id in _ready_user_dbs:
+            return user_db_path
+        os.makedirs(USER_DB_DIR, exist_ok=True)
+        if not os.path.exists(user_db_path):
+            ready = init_database(db_path=user_db_path)
+        else:
+            ready = ensure_seeded_user_database(user_db_path)
+        if ready:
+            _ready_user_dbs.add(user_id)
     return user_db_path
 
+# Resolved sessions are cached for a short time so most requests skip the auth
+# database. Kept well under AUTH_TOKEN_TTL_HOURS so deactivation applies within a minute.
+AUTH_CACHE_TTL_SECONDS = 60
+# Sessions cached at once; the least recently used entry is dropped beyond this
+AUTH_CACHE_SIZE = 1024
+# last_used_at updates are queued and written in one batch every few seconds or hits
+LAST_USED_FLUSH_SECONDS = 5.0
+LAST_USED_FLUSH_BATCH = 100
+
+_auth_cache = OrderedDict()  # token_prefix -> (user, expires_at, cached_at, token_secret), LRU first
+_pending_last_used = {}  # token_prefix -> last use, as a CURRENT_TIMESTAMP-style string
+_last_used_flushed_at = time.monotonic()
+_auth_cache_lock = threading.Lock()
+
+def record_session_use(token_prefix):
+    """Queue a last_used_at update, flushing the queue when it is due"""
+    global _last_used_flushed_at
+    now = time.monotonic()
+    with _auth_cache_lock:
+        _pending_last_used[token_prefix] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        if len(_pending_last_used) < LAST_USED_FLUSH_BATCH and now - _last_used_flushed_at < LAST_USED_FLUSH_SECONDS:
+            return
+        _last_used_flushed_at = now
+    flush_session_use()
+
+@atexit.register
+def flush_session_use():
+    """Write queued last_used_at updates in one transaction"""
+    with _auth_cache_lock:
+        updates = [(used_at, token_prefix) for token_prefix, used_at in _pending_last_used.items()]
+        _pending_last_used.clear()
+    if not updates:
+        return
+    conn = get_auth_connection()
+    if not conn:
+        return
+    try:
+        with conn:
+            conn.executemany(SQL_UPDATE_SESSION_USE, updates)
+    except sqlite3.Error as e:
+        print(f"[Auth] Could not record session use: {e}")
+    finally:
+        conn.close()
+
 def resolve_auth_user(token):
     if not token:
         return None
-    token_hash = hash_token(token)
+    token_prefix, _, token_secret = token.partition('.')
+    if not token_prefix or not token_secret:
+        return None
+    
+    with _auth_cache_lock:
+        cached = _auth_cache.get(token_prefix)
+        if cached:
+            _auth_cache.move_to_end(token_prefix)
+    if cached:
+        user, expires_at, cached_at, cached_secret = cached
+        # A cached session is verified against the secret it was resolved with, so no hashing.
+        # Compared as bytes: compare_digest raises TypeError on non-ASCII str arguments
+        if not hmac.compare_digest(cached_secret.encode(), token_secret.encode()):
+            return None
+        if time.monotonic() - cached_at < AUTH_CACHE_TTL_SECONDS and expires_at >= datetime.utcnow():
+            record_session_use(token_prefix)
+            return user
+        # Stale entry: evict and re-check against the database
+        with _auth_cache_lock:
+            _auth_cache.pop(token_prefix, None)
+    
     conn = get_auth_connection()
     if not conn:
         return None
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT s.user_id, s.expires_at, u.email, u.full_name, u.is_active
-        FROM user_sessions s
-        JOIN users u ON s.user_id = u.id
-        WHERE s.token_hash = ?
-    ''', (token_hash,))
-    row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        return None
-    expires_at = datetime.fromisoformat(row['expires_at'])
-    if expires_at < datetime.utcnow() or not row['is_active']:
-        cur.execute('DELETE FROM user_sessions WHERE token_hash = ?', (token_hash,))
-        conn.commit()
-        cur.close()
+    try:
+        row = conn.execute(SQL_SELECT_SESSION, (token_prefix,)).fetchone()
+        # The prefix is not secret, so the index lookup alone proves nothing. This is the one
+        # comparison of secret material on the token path: one SHA-256 and a constant-time
+        # compare, done only on a cache miss. Don't add another.
+        if not row or not hmac.compare_digest(row['token_hash'], hash_token(token_secret)):
+            return None
+        expires_at = datetime.fromisoformat(row['expires_at'])
+        if expires_at < datetime.utcnow() or not row['is_active']:
+            # Commits on exit, rolls back if the delete fails
+            with conn:
+                conn.execute(SQL_DELETE_SESSION, (token_prefix,))
+            return None
+    finally:
         conn.close()
-        return None
-    cur.execute('UPDATE user_sessions SET last_used_at = CURRENT_TIMESTAMP WHERE token_hash = ?', (token_hash,))
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {
+    user = {
         'user_id': row['user_id'],
         'email': row['email'],
         'full_name': row['full_name']
     }
+    with _auth_cache_lock:
+        _auth_cache[token_prefix] = (user, expires_at, time.monotonic(), token_secret)
+        _auth_cache.move_to_end(token_prefix)
+        while len(_auth_cache) > AUTH_CACHE_SIZE:
+            _auth_cache.popitem(last=False)
+    record_session_use(token_prefix)
+    return user
+
+def get_row_count(conn, table):
+    """Row count of a table in COUNTED_TABLES, read from the trigger-maintained counters"""
+    cur = conn.cursor()
+    cur.execute(SQL_SELECT_COUNTER, (table,))
+    row = cur.fetchone()
+    if row is None:
+        # Database not migrated yet
+        cur.execute(f'SELECT COUNT(*) FROM {table}')
+        row = cur.fetchone()
+    cur.close()
+    return row[0]
 
 def enforce_model_limit(conn, models_to_add=1):
     if not CE_LIMITS_ENABLED or CE_MAX_MODELS <= 0:
         return True, None
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM canvas_models')
-    total_models = cur.fetchone()[0]
-    cur.close()
+    total_models = get_row_count(conn, 'canvas_models')
     if total_models + models_to_add > CE_MAX_MODELS:
         return False, {
             'error': 'Model limit reached',
@@ -272,10 +497,7 @@ def enforce_model_limit(conn, models_to_add=1):
 def enforce_element_occurrence_limit(conn, occurrences_to_add=1, current_delta=0):
     if not CE_LIMITS_ENABLED or CE_MAX_ELEMENT_OCCURRENCES <= 0:
         return True, None
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM canvas_element_instances')
-    total_occurrences = cur.fetchone()[0]
-    cur.close()
+    total_occurrences = get_row_count(conn, 'canvas_element_instances')
     projected_total = total_occurrences + occurrences_to_add + current_delta
     if projected_total > CE_MAX_ELEMENT_OCCURRENCES:
         return False, {
@@ -289,9 +511,8 @@ def enforce_element_occurrence_limit(conn, occurrences_to_add=1, current_delta=0
 def enforce_authentication():
     if not AUTH_REQUIRED:
         return None
-    if not request.path.startswith('/api/'):
-        return None
-    if request.path in ('/api/auth/register', '/api/auth/login'):
+    path = request.path
+    if not path.startswith('/api/') or path in AUTH_EXEMPT_PATHS:
         return None
     token = extract_bearer_token()
     user = resolve_auth_user(token)
@@ -303,51 +524,258 @@ def enforce_authentication():
     g.user_db_path = ensure_user_database(user['user_id'])
     return None
 
-def init_database(db_path=None):
-    """Initialize SQLite database with all required tables"""
-    if not init_auth_database():
-        return False
-    conn = get_db_connection(db_path=db_path)
-    if not conn:
-        return False
-    
-    try:
-        cur = conn.cursor()
-        
-        # Create domainmodel table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS domainmodel (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                enterprise TEXT,
-                facet TEXT,
-                element TEXT,
-                image_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create domainmodelrelationship table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS domainmodelrelationship (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_element_id INTEGER NOT NULL,
-                target_element_id INTEGER NOT NULL,
-                relationship_type TEXT,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (source_element_id) REFERENCES domainmodel(id),
-                FOREIGN KEY (target_element_id) REFERENCES domainmodel(id)
-            )
-        ''')
-        
-        # Create domainelementproperties table
-        # Note: element_id can be NULL for template properties that can be used with any element
+# Tables, indexes and triggers, created in one executescript() call. Column changes to
+# existing tables live in MIGRATIONS.
+SCHEMA_SQL = '''
+-- Create domainmodel table
+CREATE TABLE IF NOT EXISTS domainmodel (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    enterprise TEXT,
+    facet TEXT,
+    element TEXT,
+    image_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create domainmodelrelationship table
+CREATE TABLE IF NOT EXISTS domainmodelrelationship (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_element_id INTEGER NOT NULL,
+    target_element_id INTEGER NOT NULL,
+    relationship_type TEXT,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (source_element_id) REFERENCES domainmodel(id),
+    FOREIGN KEY (target_element_id) REFERENCES domainmodel(id)
+);
+
+-- Create domainelementproperties table
+-- Note: element_id can be NULL for template properties that can be used with any element
+CREATE TABLE IF NOT EXISTS domainelementproperties (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    element_id INTEGER,
+    ragtype TEXT,
+    propertyname TEXT,
+    description TEXT,
+    image_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (element_id) REFERENCES domainmodel(id)
+);
+
+-- Create audit_log table for change tracking
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity_type TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    user_name TEXT,
+    old_value TEXT,
+    new_value TEXT,
+    change_summary TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create element_versions table for version history
+CREATE TABLE IF NOT EXISTS element_versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    element_id INTEGER NOT NULL,
+    version_number INTEGER NOT NULL,
+    name TEXT,
+    description TEXT,
+    enterprise TEXT,
+    facet TEXT,
+    element TEXT,
+    image_url TEXT,
+    created_by TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (element_id) REFERENCES domainmodel(id),
+    UNIQUE(element_id, version_number)
+);
+
+-- Create canvas_models table for drag-and-drop modeling canvas
+CREATE TABLE IF NOT EXISTS canvas_models (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    canvas_width INTEGER DEFAULT 2000,
+    canvas_height INTEGER DEFAULT 2000,
+    zoom_level REAL DEFAULT 1.0,
+    pan_x REAL DEFAULT 0,
+    pan_y REAL DEFAULT 0,
+    canvas_template TEXT DEFAULT 'none',
+    template_zoom REAL DEFAULT 1.0,
+    template_pan_x REAL DEFAULT 0,
+    template_pan_y REAL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create canvas_template_segments table for Milkyway template segments
+CREATE TABLE IF NOT EXISTS canvas_template_segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canvas_model_id INTEGER NOT NULL,
+    segment_index INTEGER NOT NULL,
+    segment_name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
+    UNIQUE(canvas_model_id, segment_index)
+);
+
+-- Create canvas_element_segment_associations table
+CREATE TABLE IF NOT EXISTS canvas_element_segment_associations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canvas_model_id INTEGER NOT NULL,
+    element_instance_id INTEGER NOT NULL,
+    segment_index INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
+    FOREIGN KEY (element_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE,
+    UNIQUE(canvas_model_id, element_instance_id)
+);
+
+-- Create canvas_element_instances table for element instances on canvas
+CREATE TABLE IF NOT EXISTS canvas_element_instances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canvas_model_id INTEGER NOT NULL,
+    element_type_id INTEGER NOT NULL,
+    instance_name TEXT NOT NULL,
+    description TEXT,
+    x_position REAL NOT NULL,
+    y_position REAL NOT NULL,
+    width INTEGER DEFAULT 120,
+    height INTEGER DEFAULT 120,
+    z_index INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
+    FOREIGN KEY (element_type_id) REFERENCES domainmodel(id)
+);
+
+-- Create canvas_relationships table for visual relationships on canvas
+CREATE TABLE IF NOT EXISTS canvas_relationships (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canvas_model_id INTEGER NOT NULL,
+    source_instance_id INTEGER NOT NULL,
+    target_instance_id INTEGER NOT NULL,
+    relationship_type TEXT,
+    line_path TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
+    FOREIGN KEY (source_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE,
+    FOREIGN KEY (target_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE
+);
+
+-- Create canvas_property_instances table for property instances on canvas
+CREATE TABLE IF NOT EXISTS canvas_property_instances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canvas_model_id INTEGER NOT NULL,
+    property_id INTEGER NOT NULL,
+    element_instance_id INTEGER NOT NULL,
+    instance_name TEXT NOT NULL,
+    x_position REAL NOT NULL,
+    y_position REAL NOT NULL,
+    width INTEGER DEFAULT 100,
+    height INTEGER DEFAULT 30,
+    z_index INTEGER DEFAULT 0,
+    source TEXT,
+    rule_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
+    FOREIGN KEY (property_id) REFERENCES domainelementproperties(id),
+    FOREIGN KEY (element_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE
+);
+
+-- Create design_rules table for smart analytics rules
+CREATE TABLE IF NOT EXISTS design_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    rule_type TEXT NOT NULL,
+    subject_element_type TEXT NOT NULL,
+    relationship_type TEXT,
+    target_element_type TEXT,
+    conditions_json TEXT,
+    active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create design_rule_violations table for cached rule evaluation results
+CREATE TABLE IF NOT EXISTS design_rule_violations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule_id INTEGER NOT NULL,
+    element_instance_id INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    current_value INTEGER NOT NULL,
+    threshold_value INTEGER NOT NULL,
+    evaluated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (rule_id) REFERENCES design_rules(id) ON DELETE CASCADE,
+    FOREIGN KEY (element_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE
+);
+
+-- Create indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_domainmodel_enterprise ON domainmodel(enterprise);
+CREATE INDEX IF NOT EXISTS idx_domainmodel_facet ON domainmodel(facet);
+CREATE INDEX IF NOT EXISTS idx_relationship_source ON domainmodelrelationship(source_element_id);
+CREATE INDEX IF NOT EXISTS idx_relationship_target ON domainmodelrelationship(target_element_id);
+CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_instances_model ON canvas_element_instances(canvas_model_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_instances_type ON canvas_element_instances(element_type_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_relationships_model ON canvas_relationships(canvas_model_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_relationships_source ON canvas_relationships(source_instance_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_relationships_target ON canvas_relationships(target_instance_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_property_instances_model ON canvas_property_instances(canvas_model_id);
+CREATE INDEX IF NOT EXISTS idx_canvas_property_instances_element ON canvas_property_instances(element_instance_id);
+-- Indexes for design rules
+CREATE INDEX IF NOT EXISTS idx_design_rules_active ON design_rules(active);
+CREATE INDEX IF NOT EXISTS idx_design_rules_subject_type ON design_rules(subject_element_type);
+CREATE INDEX IF NOT EXISTS idx_design_rule_violations_rule ON design_rule_violations(rule_id);
+CREATE INDEX IF NOT EXISTS idx_design_rule_violations_element ON design_rule_violations(element_instance_id);
+CREATE INDEX IF NOT EXISTS idx_design_rule_violations_severity ON design_rule_violations(severity);
+-- Indexes for audit log
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(entity_type, entity_id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_created_at ON audit_log(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_element_versions_element ON element_versions(element_id);
+'''
+
+# Row counters kept current by triggers so the CE limit checks avoid COUNT(*) scans
+SCHEMA_SQL += '''
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+''' + ''.join(f'''
+INSERT OR IGNORE INTO counters (key, value) SELECT '{table}', COUNT(*) FROM {table};
+CREATE TRIGGER IF NOT EXISTS {table}_count_ai AFTER INSERT ON {table}
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE key = '{table}';
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_count_ad AFTER DELETE ON {table}
+BEGIN
+    UPDATE counters SET value = value - 1 WHERE key = '{table}';
+END;
+''' for table in COUNTED_TABLES)
+
+
+def migrate_property_element_id_nullable(cur):
+    """Rebuild domainelementproperties so element_id allows NULL"""
+    cur.execute('PRAGMA table_info(domainelementproperties)')
+    columns = cur.fetchall()
+    element_id_col = next((col for col in columns if col[1] == 'element_id'), None)
+    if element_id_col and element_id_col[3] == 1:  # notnull = 1 means NOT NULL
+        # Table exists with NOT NULL constraint - need to migrate
+        print("[Database] Migrating domainelementproperties table to allow NULL element_id...")
+        # Create a temporary table with the new schema
         cur.execute('''
-            CREATE TABLE IF NOT EXISTS domainelementproperties (
+            CREATE TABLE domainelementproperties_new (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 element_id INTEGER,
                 ragtype TEXT,
@@ -359,243 +787,73 @@ def init_database(db_path=None):
                 FOREIGN KEY (element_id) REFERENCES domainmodel(id)
             )
         ''')
-        
-        # Migrate existing schema if element_id was NOT NULL
-        # SQLite doesn't support ALTER TABLE to change NOT NULL constraints easily
-        # So we'll check and recreate the table if needed
-        try:
-            cur.execute('PRAGMA table_info(domainelementproperties)')
-            columns = cur.fetchall()
-            element_id_col = next((col for col in columns if col[1] == 'element_id'), None)
-            if element_id_col and element_id_col[3] == 1:  # notnull = 1 means NOT NULL
-                # Table exists with NOT NULL constraint - need to migrate
-                print("[Database] Migrating domainelementproperties table to allow NULL element_id...")
-                # Create a temporary table with the new schema
-                cur.execute('''
-                    CREATE TABLE domainelementproperties_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        element_id INTEGER,
-                        ragtype TEXT,
-                        propertyname TEXT,
-                        description TEXT,
-                        image_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (element_id) REFERENCES domainmodel(id)
-            )
-        ''')
-                # Copy data from old table
-                cur.execute('''
-                    INSERT INTO domainelementproperties_new 
-                    (id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
-                    SELECT id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at
-                    FROM domainelementproperties
-                ''')
-                # Drop old table and rename new one
-                cur.execute('DROP TABLE domainelementproperties')
-                cur.execute('ALTER TABLE domainelementproperties_new RENAME TO domainelementproperties')
-                # Recreate indexes after migration
-                cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
-                conn.commit()
-                print("[Database] Migration completed successfully")
-        except Exception as e:
-            # If migration fails, table might already be correct or migration not needed
-            print(f"[Database] Property table migration check: {e}")
-            pass
-        
-        # Migrate existing schema if element_id was NOT NULL
-        # Check if we need to alter the table to allow NULL
-        try:
-            cur.execute('PRAGMA table_info(domainelementproperties)')
-            columns = cur.fetchall()
-            element_id_col = next((col for col in columns if col[1] == 'element_id'), None)
-            if element_id_col and element_id_col[3] == 1:  # notnull = 1 means NOT NULL
-                # Table exists with NOT NULL constraint, we can't easily alter it in SQLite
-                # But new inserts will work if we provide NULL or a value
-                pass
-        except:
-            pass
-        
-        # Create audit_log table for change tracking
+        # Copy data from old table
         cur.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                entity_type TEXT NOT NULL,
-                entity_id INTEGER NOT NULL,
-                action TEXT NOT NULL,
-                user_name TEXT,
-                old_value TEXT,
-                new_value TEXT,
-                change_summary TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create element_versions table for version history
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS element_versions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                element_id INTEGER NOT NULL,
-                version_number INTEGER NOT NULL,
-                name TEXT,
-                description TEXT,
-                enterprise TEXT,
-                facet TEXT,
-                element TEXT,
-                image_url TEXT,
-                created_by TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (element_id) REFERENCES domainmodel(id),
-                UNIQUE(element_id, version_number)
-            )
-        ''')
-        
-        # Create canvas_models table for drag-and-drop modeling canvas
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS canvas_models (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                canvas_width INTEGER DEFAULT 2000,
-                canvas_height INTEGER DEFAULT 2000,
-                zoom_level REAL DEFAULT 1.0,
-                pan_x REAL DEFAULT 0,
-                pan_y REAL DEFAULT 0,
-                canvas_template TEXT DEFAULT 'none',
-                template_zoom REAL DEFAULT 1.0,
-                template_pan_x REAL DEFAULT 0,
-                template_pan_y REAL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Add template columns if they don't exist (migration)
-        try:
-            cur.execute('PRAGMA table_info(canvas_models)')
-            columns = [col[1] for col in cur.fetchall()]
-            if 'canvas_template' not in columns:
-                cur.execute('ALTER TABLE canvas_models ADD COLUMN canvas_template TEXT DEFAULT \'none\'')
-            if 'template_zoom' not in columns:
-                cur.execute('ALTER TABLE canvas_models ADD COLUMN template_zoom REAL DEFAULT 1.0')
-            if 'template_pan_x' not in columns:
-                cur.execute('ALTER TABLE canvas_models ADD COLUMN template_pan_x REAL DEFAULT 0')
-            if 'template_pan_y' not in columns:
-                cur.execute('ALTER TABLE canvas_models ADD COLUMN template_pan_y REAL DEFAULT 0')
-        except Exception as e:
-            print(f"[Database] Template columns migration: {e}")
-        
-        # Create canvas_template_segments table for Milkyway template segments
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS canvas_template_segments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                canvas_model_id INTEGER NOT NULL,
-                segment_index INTEGER NOT NULL,
-                segment_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
-                UNIQUE(canvas_model_id, segment_index)
-            )
-        ''')
-        
-        # Create canvas_element_segment_associations table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS canvas_element_segment_associations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                canvas_model_id INTEGER NOT NULL,
-                element_instance_id INTEGER NOT NULL,
-                segment_index INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
-                FOREIGN KEY (element_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE,
-                UNIQUE(canvas_model_id, element_instance_id)
-            )
-        ''')
-        
-        # Create canvas_element_instances table for element instances on canvas
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS canvas_element_instances (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                canvas_model_id INTEGER NOT NULL,
-                element_type_id INTEGER NOT NULL,
-                instance_name TEXT NOT NULL,
-                description TEXT,
-                x_position REAL NOT NULL,
-                y_position REAL NOT NULL,
-                width INTEGER DEFAULT 120,
-                height INTEGER DEFAULT 120,
-                z_index INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
-                FOREIGN KEY (element_type_id) REFERENCES domainmodel(id)
-            )
-        ''')
-        
-        # Add description column if it doesn't exist (migration)
-        try:
-            cur.execute('PRAGMA table_info(canvas_element_instances)')
-            columns = [col[1] for col in cur.fetchall()]
-            if 'description' not in columns:
-                cur.execute('ALTER TABLE canvas_element_instances ADD COLUMN description TEXT')
-        except Exception as e:
-            print(f"[Database] Description column migration: {e}")
-        
-        # Create canvas_relationships table for visual relationships on canvas
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS canvas_relationships (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                canvas_model_id INTEGER NOT NULL,
-                source_instance_id INTEGER NOT NULL,
-                target_instance_id INTEGER NOT NULL,
-                relationship_type TEXT,
-                line_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
-                FOREIGN KEY (source_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE,
-                FOREIGN KEY (target_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Create canvas_property_instances table for property instances on canvas
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS canvas_property_instances (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                canvas_model_id INTEGER NOT NULL,
-                property_id INTEGER NOT NULL,
-                element_instance_id INTEGER NOT NULL,
-                instance_name TEXT NOT NULL,
-                x_position REAL NOT NULL,
-                y_position REAL NOT NULL,
-                width INTEGER DEFAULT 100,
-                height INTEGER DEFAULT 30,
-                z_index INTEGER DEFAULT 0,
-                source TEXT,
-                rule_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (canvas_model_id) REFERENCES canvas_models(id) ON DELETE CASCADE,
-                FOREIGN KEY (property_id) REFERENCES domainelementproperties(id),
-                FOREIGN KEY (element_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE
-            )
+            INSERT INTO domainelementproperties_new 
+            (id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
+            SELECT id, element_id, ragtype, propertyname, description, image_url, created_at, updated_at
+            FROM domainelementproperties
         ''')
-        
-        # Add source/rule_id columns to canvas_property_instances if they don't exist
-        try:
-            cur.execute('PRAGMA table_info(canvas_property_instances)')
-            columns = [col[1] for col in cur.fetchall()]
-            if 'source' not in columns:
-                cur.execute('ALTER TABLE canvas_property_instances ADD COLUMN source TEXT')
-            if 'rule_id' not in columns:
-                cur.execute('ALTER TABLE canvas_property_instances ADD COLUMN rule_id INTEGER')
-        except Exception as e:
-            print(f"[Database] canvas_property_instances migration: {e}")
-        
-        # Create design_rules table for smart analytics rules
+        # Drop old table and rename new one
+        cur.execute('DROP TABLE domainelementproperties')
+        cur.execute('ALTER TABLE domainelementproperties_new RENAME TO domainelementproperties')
+        # Recreate indexes after migration
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
+        print("[Database] Migration completed successfully")
+
+
+def migrate_canvas_template_columns(cur):
+    """Add the template columns to canvas_models"""
+    cur.execute('PRAGMA table_info(canvas_models)')
+    columns = [col[1] for col in cur.fetchall()]
+    if 'canvas_template' not in columns:
+        cur.execute('ALTER TABLE canvas_models ADD COLUMN canvas_template TEXT DEFAULT \'none\'')
+    if 'template_zoom' not in columns:
+        cur.execute('ALTER TABLE canvas_models ADD COLUMN template_zoom REAL DEFAULT 1.0')
+    if 'template_pan_x' not in columns:
+        cur.execute('ALTER TABLE canvas_models ADD COLUMN template_pan_x REAL DEFAULT 0')
+    if 'template_pan_y' not in columns:
+        cur.execute('ALTER TABLE canvas_models ADD COLUMN template_pan_y REAL DEFAULT 0')
+
+
+def migrate_canvas_instance_description(cur):
+    """Add the description column to canvas_element_instances"""
+    cur.execute('PRAGMA table_info(canvas_element_instances)')
+    columns = [col[1] for col in cur.fetchall()]
+    if 'description' not in columns:
+        cur.execute('ALTER TABLE canvas_element_instances ADD COLUMN description TEXT')
+
+
+def migrate_canvas_property_instance_source(cur):
+    """Add the source/rule_id columns to canvas_property_instances"""
+    cur.execute('PRAGMA table_info(canvas_property_instances)')
+    columns = [col[1] for col in cur.fetchall()]
+    if 'source' not in columns:
+        cur.execute('ALTER TABLE canvas_property_instances ADD COLUMN source TEXT')
+    if 'rule_id' not in columns:
+        cur.execute('ALTER TABLE canvas_property_instances ADD COLUMN rule_id INTEGER')
+
+
+def migrate_design_rules_conditions(cur):
+    """Add conditions_json to design_rules and drop the legacy rule columns"""
+    cur.execute('PRAGMA table_info(design_rules)')
+    columns = [col[1] for col in cur.fetchall()]
+    if 'conditions_json' not in columns:
+        cur.execute('ALTER TABLE design_rules ADD COLUMN conditions_json TEXT')
+        columns.append('conditions_json')
+        print("[Database] Added conditions_json column to design_rules table")
+
+    legacy_columns = {
+        'property_target',
+        'property_name',
+        'warning_threshold',
+        'negative_threshold',
+        'positive_threshold'
+    }
+    if legacy_columns.intersection(columns):
+        print("[Database] Removing legacy design_rules columns...")
         cur.execute('''
-            CREATE TABLE IF NOT EXISTS design_rules (
+            CREATE TABLE design_rules_new (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
                 description TEXT,
@@ -609,108 +867,83 @@ def init_database(db_path=None):
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        
-        # Ensure conditions_json exists and drop legacy rule fields if present
-        try:
-            cur.execute('PRAGMA table_info(design_rules)')
-            columns = [col[1] for col in cur.fetchall()]
-            if 'conditions_json' not in columns:
-                cur.execute('ALTER TABLE design_rules ADD COLUMN conditions_json TEXT')
-                conn.commit()
-                columns.append('conditions_json')
-                print("[Database] Added conditions_json column to design_rules table")
-
-            legacy_columns = {
-                'property_target',
-                'property_name',
-                'warning_threshold',
-                'negative_threshold',
-                'positive_threshold'
-            }
-            if legacy_columns.intersection(columns):
-                print("[Database] Removing legacy design_rules columns...")
-                cur.execute('PRAGMA foreign_keys = OFF')
-                try:
-                    cur.execute('''
-                        CREATE TABLE design_rules_new (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            name TEXT NOT NULL,
-                            description TEXT,
-                            rule_type TEXT NOT NULL,
-                            subject_element_type TEXT NOT NULL,
-                            relationship_type TEXT,
-                            target_element_type TEXT,
-                            conditions_json TEXT,
-                            active BOOLEAN DEFAULT 1,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    ''')
-                    select_conditions = 'conditions_json' if 'conditions_json' in columns else 'NULL as conditions_json'
-                    cur.execute(f'''
-                        INSERT INTO design_rules_new
-                        (id, name, description, rule_type, subject_element_type, relationship_type, target_element_type,
-                         conditions_json, active, created_at, updated_at)
-                        SELECT id, name, description, rule_type, subject_element_type, relationship_type, target_element_type,
-                               {select_conditions}, active, created_at, updated_at
-                        FROM design_rules
-                    ''')
-                    cur.execute('DROP TABLE design_rules')
-                    cur.execute('ALTER TABLE design_rules_new RENAME TO design_rules')
-                    conn.commit()
-                    print("[Database] Legacy design_rules columns removed")
-                finally:
-                    cur.execute('PRAGMA foreign_keys = ON')
-        except Exception as e:
-            print(f"[Database] Migration check for design_rules: {e}")
-            pass
-        
-        # Create design_rule_violations table for cached rule evaluation results
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS design_rule_violations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                rule_id INTEGER NOT NULL,
-                element_instance_id INTEGER NOT NULL,
-                severity TEXT NOT NULL,
-                current_value INTEGER NOT NULL,
-                threshold_value INTEGER NOT NULL,
-                evaluated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (rule_id) REFERENCES design_rules(id) ON DELETE CASCADE,
-                FOREIGN KEY (element_instance_id) REFERENCES canvas_element_instances(id) ON DELETE CASCADE
-            )
+        select_conditions = 'conditions_json' if 'conditions_json' in columns else 'NULL as conditions_json'
+        cur.execute(f'''
+            INSERT INTO design_rules_new
+            (id, name, description, rule_type, subject_element_type, relationship_type, target_element_type,
+             conditions_json, active, created_at, updated_at)
+            SELECT id, name, description, rule_type, subject_element_type, relationship_type, target_element_type,
+                   {select_conditions}, active, created_at, updated_at
+            FROM design_rules
         ''')
-        
-        # Create indexes for better performance
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_enterprise ON domainmodel(enterprise)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_domainmodel_facet ON domainmodel(facet)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_relationship_source ON domainmodelrelationship(source_element_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_relationship_target ON domainmodelrelationship(target_element_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_properties_element ON domainelementproperties(element_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_instances_model ON canvas_element_instances(canvas_model_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_instances_type ON canvas_element_instances(element_type_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_relationships_model ON canvas_relationships(canvas_model_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_relationships_source ON canvas_relationships(source_instance_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_relationships_target ON canvas_relationships(target_instance_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_property_instances_model ON canvas_property_instances(canvas_model_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_canvas_property_instances_element ON canvas_property_instances(element_instance_id)')
-        # Indexes for design rules
+        cur.execute('DROP TABLE design_rules')
+        cur.execute('ALTER TABLE design_rules_new RENAME TO design_rules')
+        # The rebuild dropped the indexes SCHEMA_SQL created on the old table
         cur.execute('CREATE INDEX IF NOT EXISTS idx_design_rules_active ON design_rules(active)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_design_rules_subject_type ON design_rules(subject_element_type)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_design_rule_violations_rule ON design_rule_violations(rule_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_design_rule_violations_element ON design_rule_violations(element_instance_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_design_rule_violations_severity ON design_rule_violations(severity)')
-        # Indexes for audit log
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(entity_type, entity_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_created_at ON audit_log(created_at DESC)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_element_versions_element ON element_versions(element_id)')
+        print("[Database] Legacy design_rules columns removed")
+
+
+# (version, migration) pairs applied in order to databases whose user_version is lower.
+# Version 1 covers the migrations that predate schema versioning.
+# Existing databases only pick up SCHEMA_SQL changes when SCHEMA_VERSION goes up.
+MIGRATIONS = [
+    (1, migrate_property_element_id_nullable),
+    (1, migrate_canvas_template_columns),
+    (1, migrate_canvas_instance_description),
+    (1, migrate_canvas_property_instance_source),
+    (1, migrate_design_rules_conditions),
+]
+SCHEMA_VERSION = max(version for version, _ in MIGRATIONS)
+
+
+def init_database(db_path=None):
+    """Initialize SQLite database with all required tables"""
+    if not init_auth_database():
+        return False
+    conn = get_db_connection(db_path=db_path)
+    if not conn:
+        return False
+    
+    try:
+        cur = conn.cursor()
         
-        conn.commit()
+        cur.execute('PRAGMA user_version')
+        schema_version = cur.fetchone()[0]
+        if schema_version < SCHEMA_VERSION:
+            # Run all DDL in one transaction; foreign keys are switched off around it
+            # (the PRAGMA is a no-op inside a transaction) so the table rebuilds don't cascade
+            cur.execute('PRAGMA foreign_keys = OFF')
+            try:
+                # executescript() commits any open transaction first, so BEGIN goes in the script
+                cur.executescript('BEGIN;\n' + SCHEMA_SQL)
+                applied_version = SCHEMA_VERSION
+                for version, migrate in MIGRATIONS:
+                    if version > schema_version:
+                        # A failed migration is undone on its own and logged; the rest still apply
+                        cur.execute('SAVEPOINT migration')
+                        try:
+                            migrate(cur)
+                        except sqlite3.Error as e:
+                            cur.execute('ROLLBACK TO migration')
+                            print(f"[Database] Migration {migrate.__name__} failed, will retry on next start: {e}")
+                            # Only stamp versions whose migrations all succeeded
+                            applied_version = min(applied_version, version - 1)
+                        cur.execute('RELEASE migration')
+                if applied_version > schema_version:
+                    cur.execute(f'PRAGMA user_version = {applied_version}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.execute('PRAGMA foreign_keys = ON')
         
         # Check if database is new/empty and copy data from dev database if available
-        cur.execute('SELECT COUNT(*) FROM domainmodel')
-        element_count = cur.fetchone()[0]
+        cur.execute('SELECT EXISTS (SELECT 1 FROM domainmodel)')
+        has_elements = cur.fetchone()[0]
         
-        if element_count == 0:
+        if not has_elements:
             # Database is empty, try to copy from seeded database first
             if db_path and DB_PATH and os.path.exists(DB_PATH) and db_path != DB_PATH:
                 copy_seed_database_data(conn, DB_PATH)
@@ -783,142 +1016,79 @@ def copy_seed_database_data(target_conn, seed_db_path):
         print("[Database] Seed database not found")
         return False
     try:
-        dev_conn = sqlite3.connect(seed_db_path, timeout=10.0)
-        dev_conn.row_factory = sqlite3.Row
-        dev_cur = dev_conn.cursor()
-        
+        # Attached so the rows are copied by INSERT ... SELECT inside SQLite, not through Python
+        target_conn.execute('ATTACH DATABASE ? AS seed', (seed_db_path,))
+    except sqlite3.Error as e:
+        print(f"[Database] Error opening seed database: {e}")
+        return False
+    try:
         target_cur = target_conn.cursor()
         
         # Check if dev database has data
-        dev_cur.execute('SELECT COUNT(*) FROM domainmodel')
-        dev_element_count = dev_cur.fetchone()[0]
+        target_cur.execute('SELECT COUNT(*) FROM seed.domainmodel')
+        dev_element_count = target_cur.fetchone()[0]
         
         if dev_element_count == 0:
             print("[Database] Development database is empty, nothing to copy")
-            dev_cur.close()
-            dev_conn.close()
+            target_cur.close()
             return False
         
         print(f"[Database] Copying {dev_element_count} elements from development database...")
         
-        # Copy domainmodel records
-        dev_cur.execute('''
-            SELECT id, name, description, enterprise, facet, element, image_url, 
-                   created_at, updated_at
-            FROM domainmodel
-            ORDER BY id
+        target_cur.execute('''
+            SELECT (SELECT COUNT(*) FROM seed.domainmodelrelationship),
+                   (SELECT COUNT(*) FROM seed.domainelementproperties)
         ''')
-        dev_elements = dev_cur.fetchall()
-        
-        # Create ID mapping (old_id -> new_id)
-        id_mapping = {}
-        
-        for dev_elem in dev_elements:
-            old_id = dev_elem['id']
+        dev_relationship_count, dev_property_count = target_cur.fetchone()
+        
+        with target_conn:
+            # One transaction holding the write lock from the start, so the copy
+            # commits once and cannot hit SQLITE_BUSY partway through
+            target_cur.execute('BEGIN IMMEDIATE')
+            # The target has no elements yet, so they keep their seed ids and the
+            # relationships and properties can be copied without remapping
             target_cur.execute('''
-                INSERT INTO domainmodel 
-                (name, description, enterprise, facet, element, image_url, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                dev_elem['name'],
-                dev_elem['description'],
-                dev_elem['enterprise'],
-                dev_elem['facet'],
-                dev_elem['element'],
-                dev_elem['image_url'],
-                dev_elem['created_at'],
-                dev_elem['updated_at']
-            ))
-            new_id = target_cur.lastrowid
-            id_mapping[old_id] = new_id
-        
-        print(f"[Database] Copied {len(dev_elements)} elements")
-        
-        # Copy domainmodelrelationship records (with ID mapping)
-        dev_cur.execute('''
-            SELECT source_element_id, target_element_id, relationship_type, 
-                   description, created_at, updated_at
-            FROM domainmodelrelationship
-        ''')
-        dev_relationships = dev_cur.fetchall()
-        
-        relationships_copied = 0
-        relationships_skipped = 0
-        
-        for dev_rel in dev_relationships:
-            old_source_id = dev_rel['source_element_id']
-            old_target_id = dev_rel['target_element_id']
-            
-            # Map old IDs to new IDs
-            new_source_id = id_mapping.get(old_source_id)
-            new_target_id = id_mapping.get(old_target_id)
-            
-            # Skip if IDs couldn't be mapped (shouldn't happen, but be safe)
-            if not new_source_id or not new_target_id:
-                relationships_skipped += 1
-                continue
+                INSERT INTO main.domainmodel
+                (id, name, description, enterprise, facet, element, image_url, created_at, updated_at)
+                SELECT id, name, description, enterprise, facet, element, image_url, created_at, updated_at
+                FROM seed.domainmodel
+            ''')
+            print(f"[Database] Copied {target_cur.rowcount} elements")
             
+            # Copy domainmodelrelationship records whose elements both exist
             target_cur.execute('''
-                INSERT INTO domainmodelrelationship 
+                INSERT INTO main.domainmodelrelationship
                 (source_element_id, target_element_id, relationship_type, description, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                new_source_id,
-                new_target_id,
-                dev_rel['relationship_type'],
-                dev_rel['description'],
-                dev_rel['created_at'],
-                dev_rel['updated_at']
-            ))
-            relationships_copied += 1
+                SELECT r.source_element_id, r.target_element_id, r.relationship_type,
+                       r.description, r.created_at, r.updated_at
+                FROM seed.domainmodelrelationship r
+                JOIN seed.domainmodel src ON src.id = r.source_element_id
+                JOIN seed.domainmodel tgt ON tgt.id = r.target_element_id
+            ''')
+            relationships_copied = target_cur.rowcount
+            
+            # Copy domainelementproperties records attached to a copied element
+            target_cur.execute('''
+                INSERT INTO main.domainelementproperties
+                (element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
+                SELECT p.element_id, p.ragtype, p.propertyname, p.description, p.image_url,
+                       p.created_at, p.updated_at
+                FROM seed.domainelementproperties p
+                JOIN seed.domainmodel dm ON dm.id = p.element_id
+            ''')
+            properties_copied = target_cur.rowcount
         
         print(f"[Database] Copied {relationships_copied} relationships")
+        relationships_skipped = dev_relationship_count - relationships_copied
         if relationships_skipped > 0:
             print(f"[Database] Skipped {relationships_skipped} relationships (missing element references)")
         
-        # Copy domainelementproperties records (with ID mapping)
-        dev_cur.execute('''
-            SELECT element_id, ragtype, propertyname, description, image_url, 
-                   created_at, updated_at
-            FROM domainelementproperties
-        ''')
-        dev_properties = dev_cur.fetchall()
-        
-        properties_copied = 0
-        properties_skipped = 0
-        
-        for dev_prop in dev_properties:
-            old_element_id = dev_prop['element_id']
-            new_element_id = id_mapping.get(old_element_id)
-            
-            if not new_element_id:
-                properties_skipped += 1
-                continue
-            
-            target_cur.execute('''
-                INSERT INTO domainelementproperties 
-                (element_id, ragtype, propertyname, description, image_url, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                new_element_id,
-                dev_prop['ragtype'],
-                dev_prop['propertyname'],
-                dev_prop['description'],
-                dev_prop['image_url'],
-                dev_prop['created_at'],
-                dev_prop['updated_at']
-            ))
-            properties_copied += 1
-        
         print(f"[Database] Copied {properties_copied} properties")
+        properties_skipped = dev_property_count - properties_copied
         if properties_skipped > 0:
             print(f"[Database] Skipped {properties_skipped} properties (missing element references)")
         
-        # Commit all changes
-        target_conn.commit()
-        
-        dev_cur.close()
-        dev_conn.close()
+        target_cur.close()
         
         print(f"[Database] Successfully copied data from development database: {seed_db_path}")
         return True
@@ -933,6 +1103,11 @@ def copy_seed_database_data(target_conn, seed_db_path):
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        try:
+            target_conn.execute('DETACH DATABASE seed')
+        except sqlite3.Error:
+            pass
 
 def init_process_flow_relationship(conn=None):
     """Ensure Process -> Process flow relationship rule exists in database"""
@@ -1190,10 +1365,12 @@ def chrome_devtools_config():
     """Handle Chrome DevTools configuration request - return empty response to suppress 404"""
     return '', 204  # No Content
 
-@app.route('/images/<path:filename>')
-def serve_image(filename):
-    """Serve images from public/images directory"""
-    return send_from_directory('public/images', filename)
+# Images are served by WSGI middleware in front of Flask, so they skip the request
+# hooks (auth, connection teardown) and get cache headers. Missing files fall
+# through to Flask and 404 there.
+app.wsgi_app = SharedDataMiddleware(app.wsgi_app, {
+    '/images': os.path.join(app.root_path, 'public', 'images')
+})
 
 @app.route('/api/auth/register', methods=['POST'])
 def register_user():
@@ -1374,12 +1551,18 @@ def search_element_instances():
         ''', (term_like, term_like, term_like))
         
         columns = [desc[0] for desc in cur.description]
-        instances = []
-        for row in cur.fetchall():
-            instance = dict(zip(columns, row))
-            # Get properties for this instance
-            cur.execute('''
+        instances = [dict(zip(columns, row)) for row in cur.fetchall()]
+        instance_ids = [instance['id'] for instance in instances]
+        placeholders = ','.join('?' * len(instance_ids))
+        
+        # Properties and relationships for all matched instances, one query each
+        properties_by_instance = defaultdict(list)
+        relationships_by_instance = defaultdict(list)
+        incoming_by_instance = defaultdict(list)
+        if instance_ids:
+            cur.execute(f'''
                 SELECT 
+                    cpi.element_instance_id,
                     cpi.id,
                     cpi.property_id,
                     cpi.instance_name,
@@ -1391,14 +1574,11 @@ def search_element_instances():
                     dep.description
                 FROM canvas_property_instances cpi
                 JOIN domainelementproperties dep ON cpi.property_id = dep.id
-                WHERE cpi.element_instance_id = ?
-            ''', (instance['id'],))
-            
-            prop_columns = [desc[0] for desc in cur.description]
-            properties = []
-            for prop_row in cur.fetchall():
-                prop = dict(zip(prop_columns, prop_row))
-                properties.append({
+                WHERE cpi.element_instance_id IN ({placeholders})
+                ORDER BY cpi.id
+            ''', instance_ids)
+            for prop in cur.fetchall():
+                properties_by_instance[prop['element_instance_id']].append({
                     'id': prop['id'],
                     'property_id': prop['property_id'],
                     'instance_name': prop['instance_name'],
@@ -1410,11 +1590,10 @@ def search_element_instances():
                     'description': prop['description']
                 })
             
-            instance['properties'] = properties
-            
-            # Get relationships for this instance (as source)
-            cur.execute('''
+            # Outgoing relationships (instance as source)
+            cur.execute(f'''
                 SELECT 
+                    cr.source_instance_id,
                     cr.id,
                     cr.target_instance_id,
                     cr.relationship_type,
@@ -1424,14 +1603,11 @@ def search_element_instances():
                 FROM canvas_relationships cr
                 JOIN canvas_element_instances cei ON cr.target_instance_id = cei.id
                 JOIN domainmodel dm ON cei.element_type_id = dm.id
-                WHERE cr.source_instance_id = ?
-            ''', (instance['id'],))
-            
-            rel_columns = [desc[0] for desc in cur.description]
-            relationships = []
-            for rel_row in cur.fetchall():
-                rel = dict(zip(rel_columns, rel_row))
-                relationships.append({
+                WHERE cr.source_instance_id IN ({placeholders})
+                ORDER BY cr.id
+            ''', instance_ids)
+            for rel in cur.fetchall():
+                relationships_by_instance[rel['source_instance_id']].append({
                     'id': rel['id'],
                     'target_instance_id': rel['target_instance_id'],
                     'relationship_type': rel['relationship_type'],
@@ -1440,11 +1616,10 @@ def search_element_instances():
                     'target_element_type': rel['target_element_type']
                 })
             
-            instance['relationships'] = relationships
-            
-            # Get incoming relationships for this instance (as target)
-            cur.execute('''
+            # Incoming relationships (instance as target)
+            cur.execute(f'''
                 SELECT 
+                    cr.target_instance_id,
                     cr.id,
                     cr.source_instance_id,
                     cr.relationship_type,
@@ -1454,14 +1629,11 @@ def search_element_instances():
                 FROM canvas_relationships cr
                 JOIN canvas_element_instances cei ON cr.source_instance_id = cei.id
                 JOIN domainmodel dm ON cei.element_type_id = dm.id
-                WHERE cr.target_instance_id = ?
-            ''', (instance['id'],))
-            
-            inc_columns = [desc[0] for desc in cur.description]
-            incoming_relationships = []
-            for inc_row in cur.fetchall():
-                inc = dict(zip(inc_columns, inc_row))
-                incoming_relationships.append({
+                WHERE cr.target_instance_id IN ({placeholders})
+                ORDER BY cr.id
+            ''', instance_ids)
+            for inc in cur.fetchall():
+                incoming_by_instance[inc['target_instance_id']].append({
                     'id': inc['id'],
                     'source_instance_id': inc['source_instance_id'],
                     'relationship_type': inc['relationship_type'],
@@ -1469,10 +1641,12 @@ def search_element_instances():
                     'source_element_type_id': inc['source_element_type_id'],
                     'source_element_type': inc['source_element_type']
                 })
-            
-            instance['incoming_relationships'] = incoming_relationships
+        
+        for instance in instances:
+            instance['properties'] = properties_by_instance.get(instance['id'], [])
+            instance['relationships'] = relationships_by_instance.get(instance['id'], [])
+            instance['incoming_relationships'] = incoming_by_instance.get(instance['id'], [])
             instance['image_url'] = instance['element_image_url']
-            instances.append(instance)
         
         cur.close()
         conn.close()
@@ -2224,56 +2398,35 @@ def delete_record(record_id):
         # PRAGMA must be executed on the connection, not cursor
         conn.execute('PRAGMA foreign_keys = OFF')
         
-        # Delete all related records first to avoid foreign key constraint violations
-        relationships_deleted_as_source = 0
-        relationships_deleted_as_target = 0
-        properties_deleted = 0
-        diagram_elements_deleted = 0
-        history_deleted = 0
-        
-        # 1. Delete relationships where this element is the source
-        try:
-            cur.execute('DELETE FROM domainmodelrelationship WHERE source_element_id = ?', (record_id,))
-            relationships_deleted_as_source = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete relationships as source: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        # 2. Delete relationships where this element is the target
-        try:
-            cur.execute('DELETE FROM domainmodelrelationship WHERE target_element_id = ?', (record_id,))
-            relationships_deleted_as_target = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete relationships as target: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        # 3. Delete element properties
-        try:
-            cur.execute('DELETE FROM domainelementproperties WHERE element_id = ?', (record_id,))
-            properties_deleted = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete properties: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        # 5. Delete element version history records
-        try:
-            cur.execute('DELETE FROM element_versions WHERE element_id = ?', (record_id,))
-            history_deleted = cur.rowcount
-        except Exception as e:
-            print(f"Warning: Could not delete element versions: {e}")
-            import traceback
-            traceback.print_exc()
+        # Delete all related records first to avoid foreign key constraint violations.
+        # Every statement binds the same :id and runs in the one transaction committed below.
+        child_deletes = (
+            ('relationships_as_source', 'DELETE FROM domainmodelrelationship WHERE source_element_id = :id'),
+            ('relationships_as_target', 'DELETE FROM domainmodelrelationship WHERE target_element_id = :id'),
+            ('properties', 'DELETE FROM domainelementproperties WHERE element_id = :id'),
+            ('history_records', 'DELETE FROM element_versions WHERE element_id = :id'),
+        )
+        deleted_related = {
+            'relationships_as_source': 0,
+            'relationships_as_target': 0,
+            'properties': 0,
+            'diagram_elements': 0,
+            'history_records': 0
+        }
+        params = {'id': record_id}
+        for key, sql in child_deletes:
+            try:
+                cur.execute(sql, params)
+                deleted_related[key] = cur.rowcount
+            except Exception as e:
+                print(f"Warning: Could not delete {key.replace('_', ' ')}: {e}")
+                import traceback
+                traceback.print_exc()
         
         # Now delete the element itself
         cur.execute('DELETE FROM domainmodel WHERE id = ?', (record_id,))
         element_deleted = cur.rowcount
         
-        # Re-enable foreign key constraints
-        conn.execute('PRAGMA foreign_keys = ON')
-        
         if element_deleted == 0:
             cur.close()
             conn.close()
@@ -2281,11 +2434,15 @@ def delete_record(record_id):
         
         conn.commit()
         
+        # Re-enable foreign key constraints. PRAGMA foreign_keys is ignored inside a
+        # transaction, so this only takes effect after the commit above.
+        conn.execute('PRAGMA foreign_keys = ON')
+        
         # Log audit event (don't fail if this doesn't work)
         try:
             log_audit_event(conn, 'element', record_id, 'DELETE', user_name, 
                            f"Element: {element_name}", None, 
-                           f"Deleted element: {element_name} (and {relationships_deleted_as_source + relationships_deleted_as_target} relationships, {properties_deleted} properties)")
+                           f"Deleted element: {element_name} (and {deleted_related['relationships_as_source'] + deleted_related['relationships_as_target']} relationships, {deleted_related['properties']} properties)")
         except Exception as audit_error:
             print(f"Warning: Could not log audit event: {audit_error}")
         
@@ -2293,13 +2450,7 @@ def delete_record(record_id):
         conn.close()
         return jsonify({
             'message': 'Record deleted successfully', 
-            'deleted_related': {
-                'relationships_as_source': relationships_deleted_as_source,
-                'relationships_as_target': relationships_deleted_as_target,
-                'properties': properties_deleted,
-                'diagram_elements': diagram_elements_deleted,
-                'history_records': history_deleted
-            }
+            'deleted_related': deleted_related
         })
     except Exception as e:
         if conn:
@@ -3460,6 +3611,11 @@ def get_design_rule_violations():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@lru_cache(maxsize=256)
+def parse_rule_conditions(conditions_json):
+    """Parse a design rule's conditions_json, cached by its text. Callers must not mutate the result."""
+    return _json_loads(conditions_json)
+
 def evaluate_design_rule(cur, rule_id):
     """Evaluate a design rule against all element instances and update violations table"""
     # Get the rule
@@ -3593,7 +3749,7 @@ def evaluate_design_rule(cur, rule_id):
             return cur.lastrowid
 
         try:
-            parsed_conditions = json.loads(conditions_json) if conditions_json else None
+            parsed_conditions = parse_rule_conditions(conditions_json) if conditions_json else None
         except Exception as e:
             logging.warning("Invalid conditions_json for rule_id=%s (%s): %s", rule_id, rule_name, e)
             parsed_conditions = None
@@ -3755,6 +3911,20 @@ def evaluate_design_rule(cur, rule_id):
                 rule_id
             ))
         
+        # Condition groups depend only on the rule, so build them once for all instances
+        groups = []
+        current_group = None
+        for row in parsed_conditions:
+            conj = (row.get('conjunction') or 'where').lower()
+            if conj == 'where' or current_group is None:
+                current_group = {
+                    'severity': (row.get('severity') or '').lower(),
+                    'property_target': (row.get('property_target') or 'subject').lower(),
+                    'conditions': []
+                }
+                groups.append(current_group)
+            current_group['conditions'].append(row)
+        
         for subject_instance in subject_instances:
             instance_id = subject_instance[0]
             canvas_model_id = subject_instance[2]
@@ -3763,19 +3933,6 @@ def evaluate_design_rule(cur, rule_id):
             width = subject_instance[5] or 120
             height = subject_instance[6] or 120
             element_type = subject_instance[7] or ''
-
-            groups = []
-            current_group = None
-            for row in parsed_conditions:
-                conj = (row.get('conjunction') or 'where').lower()
-                if conj == 'where' or current_group is None:
-                    current_group = {
-                        'severity': (row.get('severity') or '').lower(),
-                        'property_target': (row.get('property_target') or 'subject').lower(),
-                        'conditions': []
-                    }
-                    groups.append(current_group)
-                current_group['conditions'].append(row)
             
             for group in groups:
                 result = None
@@ -4670,7 +4827,7 @@ def chat():
                 'subject_element_type': rule[3],
                 'target_element_type': rule[4],
                 'relationship_type': rule[5],
-                'conditions': json.loads(rule[6]) if rule[6] else None,
+                'conditions': parse_rule_conditions(rule[6]) if rule[6] else None,
                 'active': rule[7]
             })
         
@@ -8290,8 +8447,7 @@ def update_canvas_model(model_id):
         
         # Update or replace elements if provided
         if 'elements' in data:
-            cur.execute('SELECT COUNT(*) FROM canvas_element_instances')
-            total_occurrences = cur.fetchone()[0]
+            total_occurrences = get_row_count(conn, 'canvas_element_instances')
             cur.execute('SELECT COUNT(*) FROM canvas_element_instances WHERE canvas_model_id = ?', (model_id,))
             current_model_occurrences = cur.fetchone()[0]
             projected_total = total_occurrences - current_model_occurrences + len(data['elements'])
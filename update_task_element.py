@@ -3,17 +3,7 @@
 Script to update Task element with image and Experience facet
 """
 
-import sqlite3
-import os
-
-DB_PATH = os.getenv('DB_PATH', 'domainmodel.db')
-
-def get_db_connection():
-    """Create and return a SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    return conn
+from db_common import get_db_connection, close_db_connection
 
 def update_task_element():
     """Update Task element with image_url and Experience facet"""
@@ -32,7 +22,7 @@ def update_task_element():
         
         if not task:
             print("Task element not found!")
-            conn.close()
+            close_db_connection()
             return False
         
         print(f"Found Task element:")
@@ -70,12 +60,12 @@ def update_task_element():
         print("=" * 60)
         
         cur.close()
-        conn.close()
+        close_db_connection()
         return True
         
     except Exception as e:
         conn.rollback()
-        conn.close()
+        close_db_connection()
         print(f"Error updating Task element: {e}")
         import traceback
         traceback.print_exc()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import sqlite3
 
-conn = sqlite3.connect('domainmodel.db')
+# Read-only: a check script must never write to the live database
+conn = sqlite3.connect('file:domainmodel.db?mode=ro', uri=True, timeout=2)
+conn.execute('PRAGMA query_only = 1')
 cur = conn.cursor()
 cur.execute('PRAGMA table_info(domainelementproperties)')
 columns = cur.fetchall()